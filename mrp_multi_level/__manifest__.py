@@ -3,7 +3,7 @@
 # License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl.html).
 {
     'name': 'MRP Multi Level',
-    'version': '11.0.1.1.0',
+    'version': '11.0.2.0.0',
     'development_status': 'Beta',
     'license': 'AGPL-3',
     'author': 'Ucamco, '
@@ -27,10 +27,12 @@
         'views/product_product_view.xml',
         'views/product_template_view.xml',
         'views/stock_location_view.xml',
+        'views/mrp_move_view.xml',
         'views/mrp_product_view.xml',
         'wizards/mrp_inventory_procure_view.xml',
         'views/mrp_inventory_view.xml',
         'wizards/mrp_multi_level_view.xml',
+        'views/mrp_run_view.xml',
         'views/mrp_menuitem.xml',
         'data/mrp_multi_level_cron.xml',
         'data/mrp_area_data.xml',
@@ -1,7 +1,21 @@
+from . import mrp_plan_mixin
+from . import mrp_net_change
 from . import mrp_area
 from . import stock_location
+from . import stock_move
+from . import stock_demand_estimate
+from . import purchase_order
+from . import mrp_bom
+from . import product_supplierinfo
+from . import product_category
+from . import stock_warehouse
+from . import resource_calendar
 from . import product_product
 from . import product_template
 from . import mrp_product
 from . import mrp_move
+from . import mrp_move_pegging
 from . import mrp_inventory
+from . import mrp_run
+from . import mrp_run_phase
+from . import mrp_run_chunk
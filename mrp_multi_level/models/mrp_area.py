@@ -3,7 +3,7 @@
 # - Jordi Ballester Alomar <jordi.ballester@eficent.com>
 # License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl.html).
 
-from odoo import fields, models
+from odoo import api, fields, models
 
 
 class MrpArea(models.Model):
@@ -24,3 +24,92 @@ class MrpArea(models.Model):
         string='Working Hours',
         related='warehouse_id.calendar_id',
     )
+    unreserved_qty = fields.Boolean(
+        string='Unreserved Quantities',
+        help="Only consider as available for the MRP the quantities on "
+             "hand that are not reserved yet.",
+    )
+    bucket_size = fields.Selection(
+        selection=[('day', 'Days'),
+                   ('week', 'Weeks'),
+                   ('month', 'Months')],
+        string='Planning Buckets', default='day', required=True,
+        help="Beyond the bucket horizon, the demand and supply of the area "
+             "are planned in buckets of this size, dated on their first "
+             "day, instead of day by day.",
+    )
+    bucket_horizon = fields.Integer(
+        string='Bucket Horizon (Days)', default=30,
+        help="Number of days from today planned day by day before the "
+             "planning buckets start.",
+    )
+    planning_horizon = fields.Integer(
+        string='Planning Horizon (Days)',
+        help="Number of days from today planned by the MRP. Zero for no "
+             "limit.",
+    )
+    horizon_policy = fields.Selection(
+        selection=[('aggregate', 'Aggregate at the Horizon'),
+                   ('skip', 'Skip')],
+        string='Beyond the Horizon', default='aggregate', required=True,
+        help="Aggregate: the demand and supply beyond the planning horizon "
+             "are planned on its last day, in a single bucket.\n"
+             "Skip: they are not planned.",
+    )
+    frozen_fence = fields.Integer(
+        string='Frozen Time Fence (Days)',
+        help="Number of days from today in which no order is planned. The "
+             "requirements inside the fence are planned on its end.",
+    )
+    slushy_fence = fields.Integer(
+        string='Slushy Time Fence (Days)',
+        help="Number of days from today in which the orders are planned "
+             "lot-for-lot, for the exact net requirements. The lot sizing "
+             "policies apply beyond.",
+    )
+    aggregate_forecast = fields.Boolean(
+        string='Aggregate Forecast',
+        help="Represent each demand estimate with a single MRP move over "
+             "its period (or one per planning bucket) instead of one move "
+             "per day. The MRP consumes its quantity evenly every day.",
+    )
+    lot_sizing = fields.Selection(
+        selection=lambda self: self._selection_lot_sizing(),
+        string='Lot Sizing', default='lfl', required=True,
+        help="Lot sizing policy of the products of the area that do not "
+             "define their own.",
+    )
+
+    @api.model
+    def create(self, vals):
+        area = super(MrpArea, self).create(vals)
+        self.env['mrp.net.change']._add(mrp_areas=area)
+        return area
+
+    @api.multi
+    def write(self, vals):
+        # Any parameter of the area (locations, buckets, horizon, fences,
+        # lot sizing...) can change the plan of all its products.
+        res = super(MrpArea, self).write(vals)
+        self.env['mrp.net.change']._add(mrp_areas=self)
+        return res
+
+    @api.multi
+    def unlink(self):
+        self.env['mrp.net.change']._add(
+            products=self.env['mrp.product'].search([
+                ('mrp_area_id', 'in', self.ids)]).mapped('product_id'))
+        return super(MrpArea, self).unlink()
+
+    @api.model
+    def _selection_lot_sizing(self):
+        """Lot sizing policies of the MRP planned orders. The MRP run
+        plans the orders of a policy with the ``_plan_lot_sizing_<policy>``
+        method of the ``mrp.multi.level`` wizard."""
+        return [
+            ('lfl', 'Lot-for-Lot'),
+            ('foq', 'Fixed Order Quantity'),
+            ('eoq', 'Economic Order Quantity'),
+            ('poq', 'Period Order Quantity'),
+            ('ww', 'Wagner-Whitin'),
+        ]
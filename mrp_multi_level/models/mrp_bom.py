@@ -0,0 +1,29 @@
+# Copyright 2018 Eficent Business and IT Consulting Services S.L.
+# License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl.html).
+
+from odoo import api, models
+
+
+class MrpBom(models.Model):
+    _name = 'mrp.bom'
+    _inherit = ['mrp.bom', 'mrp.net.change.mixin']
+
+    _mrp_net_change_fields = ['product_tmpl_id', 'product_id']
+
+    @api.multi
+    def _get_mrp_net_change_products(self):
+        # The lines are deleted with their BoM, without their unlink method.
+        return self.mapped('product_tmpl_id.product_variant_ids') | \
+            self.mapped('bom_line_ids.product_id')
+
+
+class MrpBomLine(models.Model):
+    _name = 'mrp.bom.line'
+    _inherit = ['mrp.bom.line', 'mrp.net.change.mixin']
+
+    _mrp_net_change_fields = ['product_id', 'bom_id']
+
+    @api.multi
+    def _get_mrp_net_change_products(self):
+        return self.mapped('product_id') | \
+            self.mapped('bom_id.product_tmpl_id.product_variant_ids')
@@ -10,6 +10,7 @@ from datetime import timedelta, date
 
 class MrpInventory(models.Model):
     _name = 'mrp.inventory'
+    _inherit = ['mrp.plan.mixin']
     _order = 'mrp_product_id, date'
     _description = 'MRP inventory projections'
     _rec_name = 'mrp_product_id'
@@ -64,7 +65,8 @@ class MrpInventory(models.Model):
             # TODO: 'move' supply method
             if delay and rec.mrp_area_id.calendar_id:
                 dt_date = fields.Datetime.from_string(rec.date)
-                order_release_date = rec.mrp_area_id.calendar_id.plan_days(
+                calendar = rec.mrp_area_id.calendar_id
+                order_release_date = calendar.plan_days_cached(
                     -delay - 1, dt_date).date()
             else:
                 order_release_date = fields.Date.from_string(
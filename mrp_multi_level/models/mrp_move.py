@@ -2,11 +2,14 @@
 # © 2016-18 Eficent Business and IT Consulting Services S.L.
 # License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl.html).
 
-from odoo import models, fields
+from odoo import api, models, fields
+from odoo.addons.mrp_multi_level.models.mrp_plan_mixin import \
+    BULK_INSERT_SIZE
 
 
 class MrpMove(models.Model):
     _name = 'mrp.move'
+    _inherit = ['mrp.plan.mixin']
     _order = 'mrp_product_id, mrp_date, mrp_type desc, id'
 
     # TODO: too many indexes...
@@ -27,6 +30,12 @@ class MrpMove(models.Model):
     )
     mrp_action_date = fields.Date(string='MRP Action Date')
     mrp_date = fields.Date(string='MRP Date')
+    mrp_date_end = fields.Date(
+        string='MRP End Date',
+        help="Last date of a demand spread over a period, such as an "
+             "aggregated forecast. Its quantity is consumed evenly every "
+             "day from the MRP date to this date.",
+    )
     mrp_move_down_ids = fields.Many2many(
         comodel_name='mrp.move',
         relation='mrp_move_rel',
@@ -41,6 +50,14 @@ class MrpMove(models.Model):
         column2='move_up_id',
         string='MRP Move UP',
     )
+    demand_pegging_ids = fields.One2many(
+        comodel_name='mrp.move.pegging', inverse_name='demand_move_id',
+        string='Pegged Supply',
+    )
+    supply_pegging_ids = fields.One2many(
+        comodel_name='mrp.move.pegging', inverse_name='supply_move_id',
+        string='Pegged Demand',
+    )
     mrp_minimum_stock = fields.Float(
         string='Minimum Stock',
         related='product_id.mrp_minimum_stock',
@@ -101,3 +118,71 @@ class MrpMove(models.Model):
         comodel_name='stock.move',
         string='Stock Move', index=True,
     )
+
+    @api.model
+    def _create_with_pegging(self, vals_list, pegging=None):
+        """Create the moves of ``vals_list`` with multi-row statements and
+        link them with ``pegging``, a list of (index of the upper move,
+        index of the lower move) in ``vals_list``. The values must not be
+        empty. Return the moves, in the order of ``vals_list``."""
+        moves = self._bulk_create(vals_list)
+        rows = [(moves.ids[up_index], moves.ids[down_index])
+                for up_index, down_index in pegging or []]
+        for index in range(0, len(rows), BULK_INSERT_SIZE):
+            chunk = rows[index:index + BULK_INSERT_SIZE]
+            self.env.cr.execute(
+                "INSERT INTO mrp_move_rel (move_up_id, move_down_id) "
+                "VALUES %s" % ', '.join(['%s'] * len(chunk)), chunk)
+        if rows:
+            self.env.invalidate_all()
+        return moves
+
+    @api.multi
+    def _trace(self, upward=False):
+        """Return all the moves reached from these ones following the
+        pegging (from a demand to the supply covering it) and the BoM
+        explosion (from a planned order to the demand of its components),
+        downward or ``upward``, with a single recursive query."""
+        if not self:
+            return self.browse()
+        from_col, to_col = 'up_id', 'down_id'
+        if upward:
+            from_col, to_col = to_col, from_col
+        self.env.cr.execute("""
+            WITH RECURSIVE trace(id) AS (
+                SELECT unnest(%%s::integer[])
+                UNION
+                SELECT edge.%(to)s
+                FROM trace
+                JOIN (
+                    SELECT demand_move_id AS up_id, supply_move_id AS down_id
+                    FROM mrp_move_pegging
+                    UNION ALL
+                    SELECT move_up_id, move_down_id FROM mrp_move_rel
+                ) AS edge ON edge.%(from)s = trace.id
+            )
+            SELECT id FROM trace
+        """ % {'from': from_col, 'to': to_col}, (self.ids,))
+        ids = [row[0] for row in self.env.cr.fetchall()]
+        return self.browse(ids) - self
+
+    @api.multi
+    def trace_down(self):
+        """Return the supply and component moves fulfilling these moves,
+        down to the raw materials."""
+        return self._trace()
+
+    @api.multi
+    def trace_up(self):
+        """Return the moves, up to the top-level demand, that these moves
+        fulfil."""
+        return self._trace(upward=True)
+
+    @api.multi
+    def action_view_pegging(self):
+        self.ensure_one()
+        moves = self.trace_up() | self | self.trace_down()
+        action = self.env.ref(
+            'mrp_multi_level.mrp_move_pegging_action').read()[0]
+        action['domain'] = [('id', 'in', moves.ids)]
+        return action
@@ -0,0 +1,32 @@
+# Copyright 2018 Eficent Business and IT Consulting Services S.L.
+# License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl.html).
+
+from odoo import fields, models
+
+
+class MrpMovePegging(models.Model):
+    """Quantity of a demand move of an MRP product covered by one of its
+    supply moves. Together with the links between the planned orders and
+    the demand of components they explode to (``mrp_move_rel``), it chains
+    every demand to the supply and the components that fulfil it."""
+    _name = 'mrp.move.pegging'
+    _inherit = ['mrp.plan.mixin']
+    _description = 'MRP Move Pegging'
+    _order = 'demand_move_id, supply_move_id'
+
+    mrp_area_id = fields.Many2one(
+        comodel_name='mrp.area', string='MRP Area', index=True,
+    )
+    mrp_product_id = fields.Many2one(
+        comodel_name='mrp.product', string='Product',
+        index=True, ondelete='cascade',
+    )
+    demand_move_id = fields.Many2one(
+        comodel_name='mrp.move', string='Demand',
+        required=True, index=True, ondelete='cascade',
+    )
+    supply_move_id = fields.Many2one(
+        comodel_name='mrp.move', string='Supply',
+        required=True, index=True, ondelete='cascade',
+    )
+    qty = fields.Float(string='Pegged Qty')
@@ -0,0 +1,100 @@
+# Copyright 2018 Eficent Business and IT Consulting Services S.L.
+# License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl.html).
+
+from odoo import api, fields, models
+
+
+class MrpNetChange(models.Model):
+    """Change that the modification dates cannot tell to the next net change
+    MRP run: a deleted record of a product, or a changed MRP area, whose
+    products all have to be planned again. The changes are claimed by the
+    run that reads them, and removed once it is done."""
+    _name = 'mrp.net.change'
+    _description = 'MRP Net Change'
+
+    product_id = fields.Many2one(
+        comodel_name='product.product', string='Product',
+        ondelete='cascade',
+    )
+    mrp_area_id = fields.Many2one(
+        comodel_name='mrp.area', string='MRP Area',
+        ondelete='cascade',
+    )
+    run_id = fields.Many2one(
+        comodel_name='mrp.run', string='MRP Run', index=True,
+        ondelete='set null',
+    )
+
+    @api.model
+    def _add(self, products=None, mrp_areas=None):
+        """Queue ``products``, and all the products of ``mrp_areas``, for
+        the next net change MRP run. Plain SQL, as it is called from the
+        deletion of records by any user."""
+        rows = [(product_id, None) for product_id in
+                (products.ids if products else [])]
+        rows += [(None, area_id) for area_id in
+                 (mrp_areas.ids if mrp_areas else [])]
+        if not rows:
+            return
+        self.env.cr.execute("""
+            INSERT INTO mrp_net_change (
+                product_id, mrp_area_id,
+                create_uid, create_date, write_uid, write_date)
+            SELECT r.product_id, r.mrp_area_id,
+                %%s, now() at time zone 'UTC', %%s, now() at time zone 'UTC'
+            FROM (VALUES %s) AS r (product_id, mrp_area_id)
+        """ % ', '.join(['(%s::integer, %s::integer)'] * len(rows)),
+            [self.env.uid, self.env.uid] + [
+                value for row in rows for value in row])
+
+    @api.model
+    def _claim(self, run):
+        """Assign all the queued changes to ``run``, even the ones claimed
+        by a run that did not end. Return the ids of the products they
+        affect."""
+        self.env.cr.execute("""
+            UPDATE mrp_net_change SET run_id = %s
+            RETURNING product_id, mrp_area_id
+        """, (run.id,))
+        rows = self.env.cr.fetchall()
+        product_ids = {product_id for product_id, __ in rows if product_id}
+        if any(area_id for __, area_id in rows):
+            # An MRP area plans all the MRP applicable products.
+            self.env.cr.execute(
+                "SELECT id FROM product_product WHERE mrp_applicable")
+            product_ids.update(row[0] for row in self.env.cr.fetchall())
+        return product_ids
+
+    @api.model
+    def _consume(self, run):
+        """Remove the changes taken into account by ``run``, now done."""
+        self.env.cr.execute(
+            "DELETE FROM mrp_net_change WHERE run_id = %s", (run.id,))
+
+
+class MrpNetChangeMixin(models.AbstractModel):
+    """Demand, supply or structure read by the MRP. The products of the
+    records deleted, or whose fields of ``_mrp_net_change_fields`` change,
+    are queued for the next net change MRP run: the modification dates
+    cannot tell about them."""
+    _name = 'mrp.net.change.mixin'
+    _description = 'MRP Net Change Tracking'
+
+    _mrp_net_change_fields = ['product_id']
+
+    @api.multi
+    def _get_mrp_net_change_products(self):
+        return self.mapped('product_id')
+
+    @api.multi
+    def write(self, vals):
+        if set(vals) & set(self._mrp_net_change_fields):
+            self.env['mrp.net.change']._add(
+                products=self._get_mrp_net_change_products())
+        return super(MrpNetChangeMixin, self).write(vals)
+
+    @api.multi
+    def unlink(self):
+        self.env['mrp.net.change']._add(
+            products=self._get_mrp_net_change_products())
+        return super(MrpNetChangeMixin, self).unlink()
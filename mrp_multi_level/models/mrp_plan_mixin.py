@@ -0,0 +1,120 @@
+# Copyright 2018 Eficent Business and IT Consulting Services S.L.
+# License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl.html).
+
+from odoo import api, fields, models
+
+# Number of rows inserted by a single INSERT statement.
+BULK_INSERT_SIZE = 1000
+
+
+class MrpPlanMixin(models.AbstractModel):
+    """Data of an MRP plan. Every MRP run writes its plan in a new
+    generation while the previous one keeps being read, and makes it the
+    current generation when done. Only the records of the current
+    generation are searched, or of the one in the ``mrp_generation`` key
+    of the context during an MRP run. The records of a plan are created
+    in bulk."""
+    _name = 'mrp.plan.mixin'
+    _description = 'MRP Plan Generation'
+
+    generation = fields.Integer(
+        string='Plan Generation', index=True, readonly=True,
+        default=lambda self: self._get_mrp_generation(),
+    )
+
+    @api.model
+    def _get_current_mrp_generation(self):
+        return int(self.env['ir.config_parameter'].sudo().get_param(
+            'mrp_multi_level.generation', 0))
+
+    @api.model
+    def _get_mrp_generation(self):
+        generation = self.env.context.get('mrp_generation')
+        if generation is not None:
+            return generation
+        return self._get_current_mrp_generation()
+
+    @api.model
+    def _where_calc(self, domain, active_test=True):
+        # Used by the searches, the counts and the groupings alike.
+        domain = list(domain or [])
+        if not any(isinstance(leaf, (list, tuple)) and
+                   leaf[0] == 'generation' for leaf in domain):
+            domain = [('generation', '=', self._get_mrp_generation())] + \
+                domain
+        return super(MrpPlanMixin, self)._where_calc(
+            domain, active_test=active_test)
+
+    @api.model
+    def _get_mrp_plan_columns(self, exclude=()):
+        """Return the quoted columns of the table of the model, except the
+        id, the plan generation and the ones of ``exclude``: the ones copied
+        as they are from a plan generation to another."""
+        return ['"%s"' % fname
+                for fname, field in sorted(self._fields.items())
+                if field.store and field.column_type and
+                fname not in ('id', 'generation') + tuple(exclude)]
+
+    @api.model
+    def _bulk_create(self, vals_list):
+        """Insert ``vals_list`` in the table of the model using multi-row
+        INSERT statements instead of one ORM create per record. Empty values
+        are skipped.
+
+        Values are converted to their column format the same way the ORM
+        does, the fields not given in the values get their default, and
+        stored computed fields not given in the values are recomputed
+        afterwards for all the new records at once. The ``create`` method
+        of the model is not called: its overrides, if any, do not apply to
+        the records created this way.
+        """
+        vals_list = [vals for vals in vals_list if vals]
+        if not vals_list:
+            return self.browse()
+        fnames = set()
+        for vals in vals_list:
+            fnames.update(vals)
+        # Computed once for all the records, such as the plan generation of
+        # the run.
+        defaults = self.default_get([
+            fname for fname, field in self._fields.items()
+            if field.store and field.column_type and not field.compute and
+            fname not in models.MAGIC_COLUMNS])
+        fields_to_insert = [
+            self._fields[fname] for fname in sorted(fnames | set(defaults))
+            if fname != 'id' and self._fields[fname].store and
+            self._fields[fname].column_type]
+        columns = [field.name for field in fields_to_insert]
+        if self._log_access:
+            columns += ['create_uid', 'create_date', 'write_uid',
+                        'write_date']
+            now = fields.Datetime.now()
+            log_values = [self.env.uid, now, self.env.uid, now]
+        else:
+            log_values = []
+        query = 'INSERT INTO "%s" (%s) VALUES %%s RETURNING id' % (
+            self._table, ', '.join('"%s"' % col for col in columns))
+        ids = []
+        for index in range(0, len(vals_list), BULK_INSERT_SIZE):
+            rows = []
+            for vals in vals_list[index:index + BULK_INSERT_SIZE]:
+                vals = dict(defaults, **vals)
+                row = [field.convert_to_column(vals.get(field.name), self,
+                                               vals)
+                       for field in fields_to_insert]
+                rows.append(tuple(row + log_values))
+            self.env.cr.execute(
+                query % ', '.join(['%s'] * len(rows)), rows)
+            ids += [row[0] for row in self.env.cr.fetchall()]
+        records = self.browse(ids)
+        # The ORM cache (e.g. one2many fields pointing to the new records)
+        # knows nothing about the inserted rows.
+        self.env.invalidate_all()
+        to_recompute = [
+            field for field in self._fields.values()
+            if field.store and field.compute and field.name not in fnames]
+        for field in to_recompute:
+            records._recompute_todo(field)
+        if to_recompute:
+            self.recompute()
+        return records
@@ -5,10 +5,12 @@
 from math import ceil
 
 from odoo import api, fields, models
+from odoo.tools.sql import create_index
 
 
 class MrpProduct(models.Model):
     _name = 'mrp.product'
+    _inherit = ['mrp.plan.mixin']
 
     mrp_area_id = fields.Many2one(
         comodel_name='mrp.area', string='MRP Area',
@@ -53,6 +55,19 @@ class MrpProduct(models.Model):
         comodel_name='mrp.move', inverse_name='mrp_product_id',
         string='MRP Moves',
     )
+    mrp_lot_sizing = fields.Selection(
+        string='Lot Sizing', related='product_id.mrp_lot_sizing')
+    mrp_fixed_order_qty = fields.Float(
+        string='Fixed Order Qty',
+        related='product_id.mrp_fixed_order_qty')
+    mrp_ordering_cost = fields.Float(
+        string='Ordering Cost', related='product_id.mrp_ordering_cost')
+    mrp_holding_cost = fields.Float(
+        string='Holding Cost per Day',
+        related='product_id.mrp_holding_cost')
+    mrp_grouping_period = fields.Selection(
+        string='Grouping Period',
+        related='product_id.mrp_grouping_period')
     mrp_nbr_days = fields.Integer(
         string='Nbr. Days', related='product_id.mrp_nbr_days')
     mrp_qty_available = fields.Float(
@@ -92,25 +107,50 @@ class MrpProduct(models.Model):
         compute='_compute_supply_method', store=True,
     )
 
+    @api.model_cr
+    def init(self):
+        # The MRP run looks up the MRP product of a product in an area.
+        create_index(
+            self._cr, 'mrp_product_product_id_mrp_area_id_index',
+            self._table, ['product_id', 'mrp_area_id'])
+
+    @api.multi
+    def _get_supply_rule_key(self):
+        """Return what the procurement rule of the MRP product depends on:
+        the routes of its product and category, and its MRP area."""
+        self.ensure_one()
+        routes = self.product_id.route_ids | \
+            self.product_id.categ_id.total_route_ids
+        return tuple(sorted(routes.ids)), self.mrp_area_id.id
+
     @api.multi
     @api.depends('mrp_area_id')
     def _compute_supply_method(self):
+        """The procurement rule is searched once per combination of routes
+        and MRP area, and shared by all the MRP products with it."""
         group_obj = self.env['procurement.group']
+        rules = {}
         for rec in self:
-            values = {
-                'warehouse_id': rec.mrp_area_id.warehouse_id,
-                'company_id': self.env.user.company_id.id,
-                # TODO: better way to get company
-            }
-            rule = group_obj._get_rule(
-                rec.product_id, rec.mrp_area_id.location_id, values)
+            key = rec._get_supply_rule_key()
+            if key not in rules:
+                values = {
+                    'warehouse_id': rec.mrp_area_id.warehouse_id,
+                    'company_id': self.env.user.company_id.id,
+                    # TODO: better way to get company
+                }
+                rules[key] = group_obj._get_rule(
+                    rec.product_id, rec.mrp_area_id.location_id, values)
+            rule = rules[key]
             rec.supply_method = rule.action if rule else 'none'
 
     @api.multi
     @api.depends('supply_method')
     def _compute_main_supplier(self):
         """Simplified and similar to procurement.rule logic."""
-        for rec in self.filtered(lambda r: r.supply_method == 'buy'):
+        to_buy = self.filtered(lambda r: r.supply_method == 'buy')
+        # Read the suppliers of all the products at once.
+        to_buy.mapped('product_id.seller_ids.product_id')
+        for rec in to_buy:
             suppliers = rec.product_id.seller_ids.filtered(
                 lambda r: (not r.product_id or r.product_id == rec.product_id))
             if not suppliers:
@@ -133,3 +173,22 @@ class MrpProduct(models.Model):
                 self.mrp_maximum_order_qty:
             return self.mrp_maximum_order_qty
         return qty_to_order
+
+    @api.multi
+    def _split_qty_to_order(self, qty_to_order):
+        """Return the list of order quantities covering ``qty_to_order``,
+        as successive calls to ``_adjust_qty_to_order`` would, without
+        looping over the orders of the maximum order quantity. Nothing is
+        ordered for a quantity that is not positive."""
+        self.ensure_one()
+        if qty_to_order <= 0.0:
+            return []
+        maximum = self.mrp_maximum_order_qty
+        if not maximum or qty_to_order <= maximum:
+            return [self._adjust_qty_to_order(qty_to_order)]
+        nbr_maximum = int(qty_to_order // maximum)
+        quantities = [maximum] * nbr_maximum
+        remainder = qty_to_order - nbr_maximum * maximum
+        if remainder > 0.0:
+            quantities.append(self._adjust_qty_to_order(remainder))
+        return quantities
@@ -0,0 +1,308 @@
+# Copyright 2018 Eficent Business and IT Consulting Services S.L.
+# License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl.html).
+
+from datetime import timedelta
+import logging
+import threading
+import time
+
+from odoo import api, fields, models, _
+from odoo.exceptions import UserError
+from odoo.tools import config
+
+logger = logging.getLogger(__name__)
+
+# Seconds a call of the scheduled action processes chunks for, when the
+# server does not limit the time of its requests.
+CRON_TIME_LIMIT = 240
+
+
+class MrpRun(models.Model):
+    _name = 'mrp.run'
+    _description = 'MRP Run'
+    _order = 'date_start desc, id desc'
+    _rec_name = 'date_start'
+
+    date_start = fields.Datetime(string='Start Date', readonly=True)
+    date_end = fields.Datetime(string='End Date', readonly=True)
+    user_id = fields.Many2one(
+        comodel_name='res.users', string='User', readonly=True,
+        default=lambda self: self.env.user,
+    )
+    state = fields.Selection(
+        selection=[('queued', 'Queued'),
+                   ('running', 'Running'),
+                   ('done', 'Done'),
+                   ('cancelled', 'Cancelled'),
+                   ('failed', 'Failed')],
+        string='State', default='running', readonly=True, index=True,
+    )
+    net_change = fields.Boolean(string='Net Change', readonly=True)
+    parallel = fields.Boolean(string='Parallel Run', readonly=True)
+    background = fields.Boolean(
+        string='Background Run', readonly=True,
+        help="Run processed by chunks by a scheduled action, every chunk "
+             "being committed on its own.",
+    )
+    chunk_ids = fields.One2many(
+        comodel_name='mrp.run.chunk', inverse_name='run_id',
+        string='Chunks', readonly=True,
+    )
+    progress = fields.Float(
+        string='Progress', compute='_compute_progress',
+    )
+    date_eta = fields.Datetime(
+        string='Estimated End Date', compute='_compute_progress',
+    )
+    error = fields.Text(string='Error', readonly=True)
+    generation = fields.Integer(
+        string='Plan Generation', readonly=True,
+        help="Generation of the MRP plan written by the run. It becomes the "
+             "current one, read by the planners, when the run is done.",
+    )
+    mrp_lowest_llc = fields.Integer(
+        string='Lowest Low Level Code', readonly=True,
+    )
+    product_ids = fields.Many2many(
+        comodel_name='product.product', relation='mrp_run_product_rel',
+        string='Net Change Products', readonly=True,
+    )
+    duration = fields.Float(
+        string='Duration (s)', readonly=True,
+        help="Wall time of the whole run, in seconds.",
+    )
+    query_count = fields.Integer(
+        string='SQL Queries', readonly=True,
+    )
+    records_written = fields.Integer(
+        string='Records Written', readonly=True,
+        help="Rows of the MRP plan inserted by the run, including the links "
+             "and pegging between moves, plus the moves linked again to "
+             "their MRP product after a net change copy.",
+    )
+    process_peak_memory = fields.Float(
+        string='Process Peak Memory (MB)', readonly=True,
+        help="Peak resident memory of the server process since it started, "
+             "read at the end of the run. It is not the memory used by the "
+             "run alone.",
+    )
+    phase_ids = fields.One2many(
+        comodel_name='mrp.run.phase', inverse_name='run_id',
+        string='Phases', readonly=True,
+    )
+
+    @api.model_cr
+    def init(self):
+        self._cr.execute(
+            "CREATE SEQUENCE IF NOT EXISTS mrp_plan_generation_seq")
+
+    @api.model
+    def _next_generation(self):
+        """Return a new MRP plan generation, never returned before even by
+        a concurrent transaction."""
+        self.env.cr.execute("SELECT nextval('mrp_plan_generation_seq')")
+        return self.env.cr.fetchone()[0]
+
+    @api.model
+    def _get_kept_generations(self):
+        """Return the MRP plan generations that must not be garbage
+        collected: the current one and the ones of the runs that are queued,
+        running, or failed in the background and can still be resumed."""
+        runs = self.search([
+            '|', ('state', 'in', ('queued', 'running')),
+            '&', ('state', '=', 'failed'), ('background', '=', True)])
+        return {generation for generation in runs.mapped('generation')
+                if generation} | {
+            self.env['mrp.product']._get_current_mrp_generation()}
+
+    @api.multi
+    @api.depends('state', 'chunk_ids.state')
+    def _compute_progress(self):
+        now = fields.Datetime.from_string(fields.Datetime.now())
+        for rec in self:
+            if rec.state == 'done':
+                rec.progress = 100.0
+                continue
+            if not rec.chunk_ids:
+                continue
+            # The final process counts as one more chunk.
+            done = len(rec.chunk_ids.filtered(lambda c: c.state == 'done'))
+            rec.progress = 100.0 * done / (len(rec.chunk_ids) + 1)
+            if done and rec.state == 'running':
+                elapsed = sum(rec.chunk_ids.mapped('duration'))
+                remaining = elapsed * (100.0 - rec.progress) / rec.progress
+                rec.date_eta = fields.Datetime.to_string(
+                    now + timedelta(seconds=remaining))
+
+    @api.multi
+    def _add_phases(self, phases):
+        """Store the ``phases`` measured by an MRP run profiler, adding
+        them to the totals of the run."""
+        self.ensure_one()
+        sequence = len(self.phase_ids)
+        self.write({
+            'query_count': self.query_count + sum(
+                vals['query_count'] for vals in phases),
+            'records_written': self.records_written + sum(
+                vals['records_written'] for vals in phases),
+            'process_peak_memory': max(
+                [self.process_peak_memory] +
+                [vals['process_peak_memory'] for vals in phases]),
+            'phase_ids': [
+                (0, 0, dict(vals, sequence=sequence + vals['sequence']))
+                for vals in phases],
+        })
+
+    @api.multi
+    def _record_phases(self, phases, date_end, duration):
+        """Store the ``phases`` measured by the MRP run profiler and the
+        totals of the run."""
+        self.ensure_one()
+        self._add_phases(phases)
+        self.write({
+            'date_end': date_end,
+            'state': 'done',
+            'duration': duration,
+        })
+
+    @api.multi
+    def _get_products(self):
+        """Return the products planned by the run, None for all of them."""
+        self.ensure_one()
+        if not self.net_change:
+            return None
+        return self.product_ids.with_context(active_test=False)
+
+    @api.multi
+    def action_cancel(self):
+        """Stop a background run after its current chunk. The plan it has
+        written so far is garbage collected."""
+        if self.filtered(lambda r: r.state not in ('queued', 'running')):
+            raise UserError(_("Only the queued or running MRP runs can be "
+                              "cancelled."))
+        self.write({'state': 'cancelled'})
+        return True
+
+    @api.multi
+    def action_resume(self):
+        """Queue a failed background run again, from its first pending
+        chunk."""
+        if self.filtered(lambda r: not r.background or r.state != 'failed'):
+            raise UserError(_("Only the failed background MRP runs can be "
+                              "resumed."))
+        self.write({'state': 'queued', 'error': False})
+        return True
+
+    @api.multi
+    def action_discard(self):
+        """Give up a failed background run instead of resuming it: it is
+        cancelled and the plan it has written so far is garbage
+        collected."""
+        if self.filtered(lambda r: not r.background or r.state != 'failed'):
+            raise UserError(_("Only the failed background MRP runs can be "
+                              "discarded."))
+        self.write({'state': 'cancelled'})
+        return True
+
+    @api.model
+    def _commit(self):
+        # Tests run in a single transaction that cannot be committed.
+        if not getattr(threading.current_thread(), 'testing', False):
+            self.env.cr.commit()
+
+    @api.multi
+    def _process_chunks(self, time_limit=None):
+        """Process the pending chunks of the run, committing after each
+        of them, then its final process. Stop when the run is cancelled or
+        after ``time_limit`` seconds, the next call resuming from there."""
+        self.ensure_one()
+        start = time.time()
+        wizard = self.env['mrp.multi.level']
+        self.state = 'running'
+        self._commit()
+        while True:
+            # Catch a cancellation committed by another transaction.
+            self.invalidate_cache()
+            if self.state != 'running':
+                return False
+            chunk = self.chunk_ids.filtered(lambda c: c.state == 'pending')
+            if not chunk:
+                break
+            chunk = chunk[0]
+            log_msg = 'MRP RUN %s: CHUNK %s (%s, LLC %s, OFFSET %s)' % (
+                self.id, chunk.name, chunk.mrp_area_id.name or '-',
+                chunk.llc, chunk.offset)
+            logger.info(log_msg)
+            chunk_start = time.time()
+            profiler = wizard._get_mrp_run_profiler()
+            method = getattr(
+                wizard.with_context(mrp_run_profiler=profiler,
+                                    mrp_generation=self.generation),
+                '_mrp_run_chunk_%s' % chunk.name)
+            method(chunk)
+            self._add_phases(profiler.phases)
+            chunk.write({
+                'state': 'done',
+                'duration': time.time() - chunk_start,
+            })
+            self._commit()
+            if time_limit and time.time() - start > time_limit:
+                return False
+        profiler = wizard._get_mrp_run_profiler()
+        wizard.with_context(
+            mrp_run_profiler=profiler, mrp_generation=self.generation,
+        )._mrp_finish_run(
+            self, fields.Datetime.from_string(self.date_start),
+            products=self._get_products())
+        self._add_phases(profiler.phases)
+        date_end = fields.Datetime.now()
+        self.write({
+            'date_end': date_end,
+            'state': 'done',
+            'duration': (fields.Datetime.from_string(date_end) -
+                         fields.Datetime.from_string(
+                             self.date_start)).total_seconds(),
+        })
+        self._commit()
+        return True
+
+    @api.model
+    def _get_cron_time_limit(self):
+        """Return the seconds a call of the scheduled action processes
+        chunks for: half the real time limit of the cron workers, so that
+        the chunk in progress when it is reached can end before the worker
+        is killed."""
+        limit = config.get('limit_time_real_cron', -1)
+        if limit is None or limit < 0:
+            limit = config.get('limit_time_real')
+        if not limit or limit <= 0:
+            return CRON_TIME_LIMIT
+        return limit / 2.0
+
+    @api.model
+    def _cron_process_runs(self, time_limit=None):
+        """Process the oldest queued or running background MRP run for at
+        most ``time_limit`` seconds, by default half the real time limit of
+        the server workers."""
+        if time_limit is None:
+            time_limit = self._get_cron_time_limit()
+        run = self.search([('background', '=', True),
+                           ('state', 'in', ('queued', 'running'))],
+                          order='id', limit=1)
+        if not run:
+            return False
+        try:
+            return run._process_chunks(time_limit=time_limit)
+        except Exception as e:
+            if getattr(threading.current_thread(), 'testing', False):
+                raise
+            log_msg = 'MRP RUN %s FAILED' % run.id
+            logger.exception(log_msg)
+            self.env.cr.rollback()
+            run.invalidate_cache()
+            # A cancellation may have made the run fail on a concurrent
+            # update.
+            if run.state != 'cancelled':
+                run.write({'state': 'failed', 'error': str(e)})
+                self.env.cr.commit()
+            return False
@@ -0,0 +1,41 @@
+# Copyright 2018 Eficent Business and IT Consulting Services S.L.
+# License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl.html).
+
+from odoo import fields, models
+
+
+class MrpRunChunk(models.Model):
+    """Step of an MRP run processed in the background, committed on its
+    own. The chunks of a run are processed by sequence: the preparation,
+    the initialisation of every area, then its calculation level by level
+    and batch of products by batch of products."""
+    _name = 'mrp.run.chunk'
+    _description = 'MRP Run Chunk'
+    _order = 'run_id, sequence, id'
+
+    run_id = fields.Many2one(
+        comodel_name='mrp.run', string='MRP Run',
+        required=True, index=True, ondelete='cascade',
+    )
+    sequence = fields.Integer(string='Sequence')
+    name = fields.Selection(
+        selection=[('prepare', 'Preparation'),
+                   ('initialisation', 'Initialisation'),
+                   ('calculation', 'Calculation')],
+        string='Step', required=True,
+    )
+    mrp_area_id = fields.Many2one(
+        comodel_name='mrp.area', string='MRP Area',
+    )
+    llc = fields.Integer(string='Low Level Code')
+    offset = fields.Integer(
+        string='Offset',
+        help="Position of the first MRP product of the batch planned by a "
+             "calculation chunk, among the ones of its area and level.",
+    )
+    state = fields.Selection(
+        selection=[('pending', 'Pending'),
+                   ('done', 'Done')],
+        string='State', default='pending', required=True, index=True,
+    )
+    duration = fields.Float(string='Duration (s)')
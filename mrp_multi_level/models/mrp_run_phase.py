@@ -0,0 +1,41 @@
+# Copyright 2018 Eficent Business and IT Consulting Services S.L.
+# License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl.html).
+
+from odoo import fields, models
+
+
+class MrpRunPhase(models.Model):
+    _name = 'mrp.run.phase'
+    _description = 'MRP Run Phase'
+    _order = 'run_id, sequence, id'
+
+    run_id = fields.Many2one(
+        comodel_name='mrp.run', string='MRP Run',
+        required=True, index=True, ondelete='cascade',
+    )
+    sequence = fields.Integer(string='Sequence')
+    name = fields.Selection(
+        selection=[('cleanup', 'Cleanup'),
+                   ('llc', 'Low Level Codes'),
+                   ('applicable', 'MRP Applicable'),
+                   ('net_change', 'Net Change'),
+                   ('initialisation', 'Initialisation'),
+                   ('calculation', 'Calculation'),
+                   ('final_process', 'Final Process')],
+        string='Phase', required=True,
+    )
+    mrp_area_id = fields.Many2one(
+        comodel_name='mrp.area', string='MRP Area',
+    )
+    llc = fields.Integer(string='Low Level Code')
+    date_start = fields.Datetime(string='Start Date')
+    duration = fields.Float(string='Duration (s)')
+    query_count = fields.Integer(string='SQL Queries')
+    records_written = fields.Integer(string='Records Written')
+    process_peak_memory = fields.Float(
+        string='Process Peak Memory (MB)', group_operator='max',
+        help="Peak resident memory of the server process since it started, "
+             "read at the end of the phase. It is not the memory used by the "
+             "phase alone: in a long running server, it is the same for "
+             "most phases.",
+    )
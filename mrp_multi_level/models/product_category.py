@@ -0,0 +1,19 @@
+# Copyright 2018 Eficent Business and IT Consulting Services S.L.
+# License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl.html).
+
+from odoo import api, models
+
+
+class ProductCategory(models.Model):
+    _inherit = 'product.category'
+
+    @api.multi
+    def write(self, vals):
+        # The routes of the categories give the supply method of the
+        # products of their children too.
+        if 'route_ids' in vals or 'parent_id' in vals:
+            self.env['mrp.net.change']._add(
+                products=self.env['product.product'].with_context(
+                    active_test=False).search([
+                        ('categ_id', 'child_of', self.ids)]))
+        return super(ProductCategory, self).write(vals)
@@ -26,10 +26,41 @@ class Product(models.Model):
         string='Minimum Order Qty', default=0.0,
     )
     mrp_minimum_stock = fields.Float(string='Minimum Stock')
+    mrp_lot_sizing = fields.Selection(
+        selection=lambda self: self.env['mrp.area']._selection_lot_sizing(),
+        string='Lot Sizing',
+        help="Lot sizing policy of the MRP planned orders. If empty, the "
+             "policy of the MRP area applies, or the period order quantity "
+             "if 'Nbr. Days' is set.",
+    )
+    mrp_fixed_order_qty = fields.Float(
+        string='Fixed Order Qty',
+        help="Quantity ordered with the fixed order quantity lot sizing.",
+    )
+    mrp_ordering_cost = fields.Float(
+        string='Ordering Cost',
+        help="Cost of placing an order, used by the economic order "
+             "quantity and Wagner-Whitin lot sizings.",
+    )
+    mrp_holding_cost = fields.Float(
+        string='Holding Cost per Day',
+        help="Cost of keeping a unit in stock for a day, used by the "
+             "economic order quantity and Wagner-Whitin lot sizings.",
+    )
+    mrp_grouping_period = fields.Selection(
+        selection=[('day', 'Days'),
+                   ('week', 'Weeks'),
+                   ('month', 'Months')],
+        string='Grouping Period', default='day',
+        help="Unit of the periods the demand is grouped by when 'Nbr. "
+             "Days' is set. Weeks and months are calendar aligned.",
+    )
     mrp_nbr_days = fields.Integer(
         string='Nbr. Days', default=0,
         help="Number of days to group demand for this product during the "
-             "MRP run, in order to determine the quantity to order.",
+             "MRP run, in order to determine the quantity to order. It is "
+             "a number of weeks or months if the grouping period is set "
+             "so.",
     )
     mrp_product_ids = fields.One2many(
         comodel_name='mrp.product',
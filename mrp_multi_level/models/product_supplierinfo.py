@@ -0,0 +1,19 @@
+# Copyright 2018 Eficent Business and IT Consulting Services S.L.
+# License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl.html).
+
+from odoo import api, models
+
+
+class ProductSupplierinfo(models.Model):
+    _name = 'product.supplierinfo'
+    _inherit = ['product.supplierinfo', 'mrp.net.change.mixin']
+
+    # The main supplier and the purchase lead time of the products.
+    _mrp_net_change_fields = [
+        'name', 'product_id', 'product_tmpl_id', 'sequence', 'delay']
+
+    @api.multi
+    def _get_mrp_net_change_products(self):
+        return self.mapped('product_id') | self.filtered(
+            lambda r: not r.product_id).mapped(
+            'product_tmpl_id.product_variant_ids')
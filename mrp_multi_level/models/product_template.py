@@ -36,12 +36,53 @@ class ProductTemplate(models.Model):
         compute='_compute_mrp_minimum_stock',
         inverse='_set_mrp_minimum_stock', store=True
     )
+    mrp_lot_sizing = fields.Selection(
+        selection=lambda self: self.env['mrp.area']._selection_lot_sizing(),
+        string='Lot Sizing',
+        compute='_compute_mrp_lot_sizing',
+        inverse='_set_mrp_lot_sizing', store=True,
+        help="Lot sizing policy of the MRP planned orders. If empty, the "
+             "policy of the MRP area applies, or the period order quantity "
+             "if 'Nbr. Days' is set.",
+    )
+    mrp_fixed_order_qty = fields.Float(
+        string='Fixed Order Qty',
+        compute='_compute_mrp_fixed_order_qty',
+        inverse='_set_mrp_fixed_order_qty', store=True,
+        help="Quantity ordered with the fixed order quantity lot sizing.",
+    )
+    mrp_ordering_cost = fields.Float(
+        string='Ordering Cost',
+        compute='_compute_mrp_ordering_cost',
+        inverse='_set_mrp_ordering_cost', store=True,
+        help="Cost of placing an order, used by the economic order "
+             "quantity and Wagner-Whitin lot sizings.",
+    )
+    mrp_holding_cost = fields.Float(
+        string='Holding Cost per Day',
+        compute='_compute_mrp_holding_cost',
+        inverse='_set_mrp_holding_cost', store=True,
+        help="Cost of keeping a unit in stock for a day, used by the "
+             "economic order quantity and Wagner-Whitin lot sizings.",
+    )
+    mrp_grouping_period = fields.Selection(
+        selection=[('day', 'Days'),
+                   ('week', 'Weeks'),
+                   ('month', 'Months')],
+        string='Grouping Period',
+        compute='_compute_mrp_grouping_period',
+        inverse='_set_mrp_grouping_period', store=True,
+        help="Unit of the periods the demand is grouped by when 'Nbr. "
+             "Days' is set. Weeks and months are calendar aligned.",
+    )
     mrp_nbr_days = fields.Integer(
         string='Nbr. Days',
         compute='_compute_mrp_nbr_days',
         inverse='_set_mrp_nbr_days', store=True,
         help="Number of days to group demand for this product during the "
-             "MRP run, in order to determine the quantity to order.",
+             "MRP run, in order to determine the quantity to order. It is "
+             "a number of weeks or months if the grouping period is set "
+             "so.",
     )
     mrp_qty_multiple = fields.Float(
         string='Qty Multiple', default=1.00,
@@ -159,6 +200,91 @@ class ProductTemplate(models.Model):
             self.product_variant_ids.mrp_minimum_stock = \
                 self.mrp_minimum_stock
 
+    @api.depends('product_variant_ids',
+                 'product_variant_ids.mrp_lot_sizing')
+    def _compute_mrp_lot_sizing(self):
+        unique_variants = self.filtered(
+            lambda template: len(template.product_variant_ids) == 1)
+        for template in unique_variants:
+            template.mrp_lot_sizing = \
+                template.product_variant_ids.mrp_lot_sizing
+        for template in (self - unique_variants):
+            template.mrp_lot_sizing = False
+
+    @api.one
+    def _set_mrp_lot_sizing(self):
+        if len(self.product_variant_ids) == 1:
+            self.product_variant_ids.mrp_lot_sizing = \
+                self.mrp_lot_sizing
+
+    @api.depends('product_variant_ids',
+                 'product_variant_ids.mrp_fixed_order_qty')
+    def _compute_mrp_fixed_order_qty(self):
+        unique_variants = self.filtered(
+            lambda template: len(template.product_variant_ids) == 1)
+        for template in unique_variants:
+            template.mrp_fixed_order_qty = \
+                template.product_variant_ids.mrp_fixed_order_qty
+        for template in (self - unique_variants):
+            template.mrp_fixed_order_qty = 0.0
+
+    @api.one
+    def _set_mrp_fixed_order_qty(self):
+        if len(self.product_variant_ids) == 1:
+            self.product_variant_ids.mrp_fixed_order_qty = \
+                self.mrp_fixed_order_qty
+
+    @api.depends('product_variant_ids',
+                 'product_variant_ids.mrp_ordering_cost')
+    def _compute_mrp_ordering_cost(self):
+        unique_variants = self.filtered(
+            lambda template: len(template.product_variant_ids) == 1)
+        for template in unique_variants:
+            template.mrp_ordering_cost = \
+                template.product_variant_ids.mrp_ordering_cost
+        for template in (self - unique_variants):
+            template.mrp_ordering_cost = 0.0
+
+    @api.one
+    def _set_mrp_ordering_cost(self):
+        if len(self.product_variant_ids) == 1:
+            self.product_variant_ids.mrp_ordering_cost = \
+                self.mrp_ordering_cost
+
+    @api.depends('product_variant_ids',
+                 'product_variant_ids.mrp_holding_cost')
+    def _compute_mrp_holding_cost(self):
+        unique_variants = self.filtered(
+            lambda template: len(template.product_variant_ids) == 1)
+        for template in unique_variants:
+            template.mrp_holding_cost = \
+                template.product_variant_ids.mrp_holding_cost
+        for template in (self - unique_variants):
+            template.mrp_holding_cost = 0.0
+
+    @api.one
+    def _set_mrp_holding_cost(self):
+        if len(self.product_variant_ids) == 1:
+            self.product_variant_ids.mrp_holding_cost = \
+                self.mrp_holding_cost
+
+    @api.depends('product_variant_ids',
+                 'product_variant_ids.mrp_grouping_period')
+    def _compute_mrp_grouping_period(self):
+        unique_variants = self.filtered(
+            lambda template: len(template.product_variant_ids) == 1)
+        for template in unique_variants:
+            template.mrp_grouping_period = \
+                template.product_variant_ids.mrp_grouping_period
+        for template in (self - unique_variants):
+            template.mrp_grouping_period = 'day'
+
+    @api.one
+    def _set_mrp_grouping_period(self):
+        if len(self.product_variant_ids) == 1:
+            self.product_variant_ids.mrp_grouping_period = \
+                self.mrp_grouping_period
+
     @api.depends('product_variant_ids',
                  'product_variant_ids.mrp_nbr_days')
     def _compute_mrp_nbr_days(self):
@@ -0,0 +1,20 @@
+# Copyright 2018 Eficent Business and IT Consulting Services S.L.
+# License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl.html).
+
+from odoo import api, models
+
+
+class PurchaseOrder(models.Model):
+    _name = 'purchase.order'
+    _inherit = ['purchase.order', 'mrp.net.change.mixin']
+
+    @api.multi
+    def _get_mrp_net_change_products(self):
+        # The lines are deleted with their order, without their unlink
+        # method.
+        return self.mapped('order_line.product_id')
+
+
+class PurchaseOrderLine(models.Model):
+    _name = 'purchase.order.line'
+    _inherit = ['purchase.order.line', 'mrp.net.change.mixin']
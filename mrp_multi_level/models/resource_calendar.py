@@ -0,0 +1,45 @@
+# Copyright 2018 Eficent Business and IT Consulting Services S.L.
+# License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl.html).
+
+from odoo import api, models
+
+
+class ResourceCalendar(models.Model):
+    _inherit = 'resource.calendar'
+
+    @api.multi
+    def _add_mrp_net_change(self):
+        """Queue the MRP areas planned with the calendars, whose action
+        dates they give, for the next net change MRP run."""
+        if self:
+            self.env['mrp.net.change']._add(
+                mrp_areas=self.env['mrp.area'].search([
+                    ('warehouse_id.calendar_id', 'in', self.ids)]))
+
+    @api.multi
+    def write(self, vals):
+        # Working hours and leaves alike.
+        self._add_mrp_net_change()
+        return super(ResourceCalendar, self).write(vals)
+
+
+class ResourceCalendarLeaves(models.Model):
+    _inherit = 'resource.calendar.leaves'
+
+    @api.model
+    def create(self, vals):
+        leave = super(ResourceCalendarLeaves, self).create(vals)
+        leave.mapped('calendar_id')._add_mrp_net_change()
+        return leave
+
+    @api.multi
+    def write(self, vals):
+        calendars = self.mapped('calendar_id')
+        res = super(ResourceCalendarLeaves, self).write(vals)
+        (calendars | self.mapped('calendar_id'))._add_mrp_net_change()
+        return res
+
+    @api.multi
+    def unlink(self):
+        self.mapped('calendar_id')._add_mrp_net_change()
+        return super(ResourceCalendarLeaves, self).unlink()
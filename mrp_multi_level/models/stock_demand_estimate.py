@@ -0,0 +1,9 @@
+# Copyright 2018 Eficent Business and IT Consulting Services S.L.
+# License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl.html).
+
+from odoo import models
+
+
+class StockDemandEstimate(models.Model):
+    _name = 'stock.demand.estimate'
+    _inherit = ['stock.demand.estimate', 'mrp.net.change.mixin']
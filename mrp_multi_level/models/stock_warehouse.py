@@ -0,0 +1,18 @@
+# Copyright 2018 Eficent Business and IT Consulting Services S.L.
+# License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl.html).
+
+from odoo import api, models
+
+
+class StockWarehouse(models.Model):
+    _inherit = 'stock.warehouse'
+
+    @api.multi
+    def write(self, vals):
+        # The calendar of the warehouse gives the action dates of all the
+        # products of its MRP areas.
+        if 'calendar_id' in vals:
+            self.env['mrp.net.change']._add(
+                mrp_areas=self.env['mrp.area'].search([
+                    ('warehouse_id', 'in', self.ids)]))
+        return super(StockWarehouse, self).write(vals)
@@ -1,2 +1,3 @@
 # License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl).
 from . import test_mrp_multi_level
+from . import test_mrp_multi_level_benchmark
@@ -0,0 +1,191 @@
+# Copyright 2018 Eficent Business and IT Consulting Services S.L.
+#   (http://www.eficent.com)
+# License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl.html).
+
+import random
+from datetime import date, timedelta
+
+from odoo import fields
+
+
+class MrpBenchmarkCatalogue(object):
+    """Synthetic catalogue to measure the MRP engine on large data sets.
+
+    ``products`` products are spread over ``depth`` + 1 BoM levels. Every
+    product above the last level is manufactured from ``fan_out``
+    components of the next level, the products of the last level are
+    bought. ``areas`` MRP areas (the first one being the MRP area of the
+    main warehouse) get ``moves`` open delivery moves, purchase order lines
+    and demand estimates in total. The generation is seeded, so that two
+    catalogues built with the same parameters are identical.
+    """
+
+    def __init__(self, env, products=60, depth=3, fan_out=3, areas=1,
+                 moves=60, seed=1):
+        self.env = env
+        self.nbr_products = products
+        self.depth = depth
+        self.fan_out = fan_out
+        self.nbr_areas = areas
+        self.nbr_moves = moves
+        self.random = random.Random(seed)
+        self.levels = []
+        self.areas = env['mrp.area']
+        self.vendor = env['res.partner']
+
+    @property
+    def products(self):
+        return self.env['product.product'].browse(
+            [product.id for level in self.levels for product in level])
+
+    def build(self):
+        self.vendor = self.env['res.partner'].create({
+            'name': 'Benchmark Vendor',
+            'supplier': True,
+        })
+        self._build_areas()
+        self._build_products()
+        self._build_boms()
+        self._build_stock_moves()
+        self._build_purchase_orders()
+        self._build_demand_estimates()
+        return self
+
+    def _build_areas(self):
+        self.areas = self.env.ref('mrp_multi_level.mrp_area_stock_wh0')
+        calendar = self.env.ref('resource.resource_calendar_std')
+        self.areas.warehouse_id.calendar_id = calendar
+        for index in range(1, self.nbr_areas):
+            warehouse = self.env['stock.warehouse'].create({
+                'name': 'Benchmark Warehouse %s' % index,
+                'code': 'BM%s' % index,
+                'calendar_id': calendar.id,
+            })
+            self.areas |= self.env['mrp.area'].create({
+                'name': 'Benchmark Area %s' % index,
+                'warehouse_id': warehouse.id,
+                'location_id': warehouse.lot_stock_id.id,
+            })
+
+    def _build_products(self):
+        route_buy = self.env.ref('purchase.route_warehouse0_buy')
+        route_manufacture = self.env.ref('mrp.route_warehouse0_manufacture')
+        nbr_levels = self.depth + 1
+        for level in range(nbr_levels):
+            nbr = self.nbr_products // nbr_levels
+            if level < self.nbr_products % nbr_levels:
+                nbr += 1
+            bought = level == self.depth
+            products = []
+            for index in range(nbr):
+                vals = {
+                    'name': 'Benchmark L%s-%s' % (level, index),
+                    'default_code': 'BM-L%s-%s' % (level, index),
+                    'type': 'product',
+                    'mrp_applicable': True,
+                    'produce_delay': self.random.randint(0, 5),
+                    'route_ids': [
+                        (6, 0, (route_buy if bought else
+                                route_manufacture).ids)],
+                }
+                if bought:
+                    vals['seller_ids'] = [(0, 0, {
+                        'name': self.vendor.id,
+                        'price': 10.0,
+                        'delay': self.random.randint(1, 10),
+                    })]
+                products.append(self.env['product.product'].create(vals))
+            self.levels.append(products)
+
+    def _build_boms(self):
+        for level, products in enumerate(self.levels[:-1]):
+            components = self.levels[level + 1]
+            for product in products:
+                lines = self.random.sample(
+                    components, min(self.fan_out, len(components)))
+                self.env['mrp.bom'].create({
+                    'product_tmpl_id': product.product_tmpl_id.id,
+                    'product_qty': 1.0,
+                    'bom_line_ids': [(0, 0, {
+                        'product_id': component.id,
+                        'product_qty': self.random.randint(1, 4),
+                    }) for component in lines],
+                })
+
+    def _random_date(self, days=60):
+        return date.today() + timedelta(days=self.random.randint(0, days))
+
+    def _build_stock_moves(self):
+        customer_location = self.env.ref('stock.stock_location_customers')
+        moves = self.env['stock.move']
+        for index in range(self.nbr_moves):
+            product = self.random.choice(self.levels[0])
+            area = self.random.choice(self.areas)
+            move_date = fields.Date.to_string(self._random_date())
+            moves |= moves.create({
+                'name': 'Benchmark move %s' % index,
+                'product_id': product.id,
+                'product_uom': product.uom_id.id,
+                'product_uom_qty': self.random.randint(1, 50),
+                'date': move_date,
+                'date_expected': move_date,
+                'location_id': area.location_id.id,
+                'location_dest_id': customer_location.id,
+                'picking_type_id': area.warehouse_id.out_type_id.id,
+            })
+        moves._action_confirm()
+
+    def _build_purchase_orders(self):
+        lines_by_area = dict((area.id, []) for area in self.areas)
+        for __ in range(self.nbr_moves):
+            product = self.random.choice(self.levels[-1])
+            area = self.random.choice(self.areas)
+            lines_by_area[area.id].append((0, 0, {
+                'name': product.name,
+                'product_id': product.id,
+                'product_uom': product.uom_id.id,
+                'product_qty': self.random.randint(1, 100),
+                'price_unit': 10.0,
+                'date_planned': fields.Date.to_string(self._random_date()),
+            }))
+        for area in self.areas:
+            if not lines_by_area[area.id]:
+                continue
+            self.env['purchase.order'].create({
+                'partner_id': self.vendor.id,
+                'picking_type_id': area.warehouse_id.in_type_id.id,
+                'order_line': lines_by_area[area.id],
+            })
+
+    def _build_demand_estimates(self):
+        range_type = self.env['date.range.type'].create({
+            'name': 'Benchmark Weeks',
+            'company_id': False,
+            'allow_overlap': False,
+        })
+        date_ranges = self.env['date.range']
+        for week in range(8):
+            date_start = date.today() + timedelta(weeks=week)
+            date_ranges |= date_ranges.create({
+                'name': 'Benchmark W-%s' % week,
+                'type_id': range_type.id,
+                'date_start': fields.Date.to_string(date_start),
+                'date_end': fields.Date.to_string(
+                    date_start + timedelta(days=6)),
+            })
+        estimates = set()
+        for __ in range(self.nbr_moves):
+            product = self.random.choice(self.levels[0])
+            area = self.random.choice(self.areas)
+            date_range = self.random.choice(date_ranges)
+            key = (product.id, area.id, date_range.id)
+            if key in estimates:
+                continue
+            estimates.add(key)
+            self.env['stock.demand.estimate'].create({
+                'product_id': product.id,
+                'location_id': area.location_id.id,
+                'product_uom': product.uom_id.id,
+                'product_uom_qty': self.random.randint(7, 140),
+                'date_range_id': date_range.id,
+            })
@@ -2,10 +2,15 @@
 #   (http://www.eficent.com)
 # License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl.html).
 
+from collections import defaultdict
 from datetime import datetime, timedelta
+from unittest.mock import patch
 
 from odoo.tests.common import SavepointCase
-from odoo import fields
+from odoo import fields, models
+from odoo.exceptions import UserError
+from odoo.addons.mrp_multi_level.wizards.mrp_multi_level import \
+    MrpMoveBuffer
 from dateutil.rrule import WEEKLY
 
 
@@ -235,6 +240,51 @@ class TestMrpMultiLevel(SavepointCase):
             'date_range_id': date_range.id,
         })
 
+    def _get_plan_snapshot(self):
+        inventories = self.mrp_inventory_obj.search([])
+        return sorted(
+            (inv.mrp_area_id.id, inv.mrp_product_id.product_id.id, inv.date,
+             inv.demand_qty, inv.supply_qty, inv.to_procure,
+             inv.final_on_hand_qty)
+            for inv in inventories)
+
+    def _get_moves_snapshot(self):
+        """Return the MRP moves of the current plan and their pegging,
+        summed by date as the order of the moves of a same date depends on
+        their ids."""
+        moves = sorted(
+            (move.mrp_area_id.id, move.product_id.id, move.mrp_date,
+             move.mrp_date_end, move.mrp_type, move.mrp_action,
+             move.mrp_origin, move.mrp_qty, move.parent_product_id.id,
+             move.mrp_product_id.product_id.id,
+             tuple(sorted(move.mrp_move_up_ids.mapped('product_id').ids)))
+            for move in self.mrp_move_obj.search([]))
+        pegging = defaultdict(float)
+        for rec in self.env['mrp.move.pegging'].search([]):
+            demand, supply = rec.demand_move_id, rec.supply_move_id
+            pegging[(rec.mrp_product_id.product_id.id, demand.mrp_date,
+                     supply.mrp_date, supply.mrp_action)] += rec.qty
+        return moves, sorted(pegging.items())
+
+    def _run_net_change(self, records, **kwargs):
+        """Run a net change MRP run that only sees the changes made to
+        ``records``: all the records written by the test transaction are
+        dated when it started, as the last run. The last run date is moved
+        to the future, and ``records`` are dated after it."""
+        last_run_date = datetime.now() + timedelta(days=1)
+        self.env['ir.config_parameter'].sudo().set_param(
+            'mrp_multi_level.last_run_date',
+            fields.Datetime.to_string(last_run_date))
+        self.cr.execute(
+            'UPDATE "%s" SET write_date = %%s WHERE id IN %%s' %
+            records._table, (
+                fields.Datetime.to_string(
+                    last_run_date + timedelta(hours=1)),
+                tuple(records.ids)))
+        records.invalidate_cache()
+        kwargs['net_change'] = True
+        return self.mrp_multi_level_wiz.create(kwargs).run_mrp_multi_level()
+
     def test_01_mrp_levels(self):
         """Tests computation of MRP levels."""
         self.assertEqual(self.fp_1.llc, 0)
@@ -463,6 +513,790 @@ class TestMrpMultiLevel(SavepointCase):
         mrp_inv_multiple = self.mrp_inventory_obj.search([
             ('mrp_product_id.product_id', '=', self.prod_multiple.id)])
         self.assertEqual(mrp_inv_multiple.to_procure, 125)
+        # nothing to order:
+        mrp_product = self.mrp_product_obj.search([
+            ('product_id', '=', self.prod_min.id)])
+        self.assertEqual(mrp_product._split_qty_to_order(0.0), [])
+        res = self.mrp_multi_level_wiz.create_move(
+            mrp_product, fields.Date.today(), 0.0, 'Test')
+        self.assertEqual(res['qty_ordered'], 0.0)
+        self.assertFalse(self.mrp_move_obj.search([
+            ('mrp_product_id', '=', mrp_product.id),
+            ('name', '=', 'Test')]))
+
+    def test_09_llc_bom_cycle(self):
+        """Test that recursive BoMs are reported instead of looping
+        forever when computing the low level codes."""
+        prod_a = self.product_obj.create({
+            'name': 'Cycle A',
+            'type': 'product',
+        })
+        prod_b = self.product_obj.create({
+            'name': 'Cycle B',
+            'type': 'product',
+        })
+        for product, component in [(prod_a, prod_b), (prod_b, prod_a)]:
+            self.env['mrp.bom'].create({
+                'product_tmpl_id': product.product_tmpl_id.id,
+                'product_qty': 1.0,
+                'bom_line_ids': [(0, 0, {
+                    'product_id': component.id,
+                    'product_qty': 1.0,
+                })],
+            })
+        with self.assertRaises(UserError):
+            self.mrp_multi_level_wiz._low_level_code_calculation()
+
+    def test_10_net_change(self):
+        """Test that a net change run only plans again the changed products
+        and their components, and gives the same plan than a full
+        regeneration."""
+        self.po.order_line.product_qty = 50.0
+        self._run_net_change(self.po.order_line)
+        run = self.env['mrp.run'].search([], limit=1)
+        self.assertTrue(run.net_change)
+        self.assertIn(self.pp_2, run.product_ids)
+        self.assertFalse(run.product_ids & (self.fp_1 | self.sf_1))
+        self.assertTrue(run.product_ids < self.product_obj.search([
+            ('mrp_applicable', '=', True)]))
+        # The demand exploded from the parents that are not planned again
+        # is copied and linked to the new MRP product of the component:
+        exploded = self.mrp_move_obj.search([
+            ('product_id', '=', self.pp_2.id),
+            ('mrp_move_up_ids', '!=', False)])
+        self.assertTrue(exploded)
+        self.assertEqual(
+            set(exploded.mapped('mrp_product_id.generation')),
+            {run.generation})
+        net_change_plan = self._get_plan_snapshot()
+        net_change_moves = self._get_moves_snapshot()
+        self.mrp_multi_level_wiz.create({}).run_mrp_multi_level()
+        self.assertEqual(net_change_plan, self._get_plan_snapshot())
+        self.assertEqual(net_change_moves, self._get_moves_snapshot())
+        pp_2_line = self.mrp_inventory_obj.search([
+            ('mrp_product_id.product_id', '=', self.pp_2.id),
+            ('date', '=', self.date_3)])
+        # 90.0 demand - 20.0 on hand - 50.0 on PO = 20.0
+        self.assertEqual(pp_2_line.to_procure, 20.0)
+
+    def test_11_cleanup(self):
+        """Test the SQL cleanup of the MRP data, scoped by area."""
+        area = self.env.ref('mrp_multi_level.mrp_area_stock_wh0')
+        other_area = self.env['mrp.area'].create({
+            'name': 'Other Area',
+            'warehouse_id': self.wh.id,
+            'location_id': self.customer_location.id,
+        })
+        nbr_moves = self.mrp_move_obj.search_count([
+            ('mrp_area_id', '=', area.id)])
+        res = self.mrp_multi_level_wiz._mrp_cleanup(mrp_areas=other_area)
+        self.assertEqual(res['mrp_move'], 0)
+        self.assertEqual(res['mrp_product'], 0)
+        res = self.mrp_multi_level_wiz._mrp_cleanup(mrp_areas=area)
+        self.assertEqual(res['mrp_move'], nbr_moves)
+        self.assertFalse(self.mrp_move_obj.search([
+            ('mrp_area_id', '=', area.id)]))
+        self.assertFalse(self.mrp_product_obj.search([
+            ('mrp_area_id', '=', area.id)]))
+        self.assertFalse(self.mrp_inventory_obj.search([
+            ('mrp_area_id', '=', area.id)]))
+
+    def test_12_grouped_demand(self):
+        """Test the grouping of the demand in periods of days and weeks."""
+        self.prod_test.mrp_nbr_days = 7
+        self.mrp_multi_level_wiz.create({}).run_mrp_multi_level()
+        demand = self.mrp_move_obj.search([
+            ('product_id', '=', self.prod_test.id),
+            ('mrp_action', '=', 'none'),
+            ('mrp_type', '=', 'd')])
+        actions = self.mrp_move_obj.search([
+            ('product_id', '=', self.prod_test.id),
+            ('mrp_action', '=', 'po')])
+        # 18 days of demand grouped by 7 days:
+        self.assertEqual(len(actions), 3)
+        self.assertEqual(
+            sum(actions.mapped('mrp_qty')), -sum(demand.mapped('mrp_qty')))
+        self.assertEqual(
+            actions[0].name, 'Supply: Grouped Demand for 7 Days')
+        self.prod_test.write({
+            'mrp_nbr_days': 1,
+            'mrp_grouping_period': 'week',
+        })
+        self.mrp_multi_level_wiz.create({}).run_mrp_multi_level()
+        demand = self.mrp_move_obj.search([
+            ('product_id', '=', self.prod_test.id),
+            ('mrp_action', '=', 'none'),
+            ('mrp_type', '=', 'd')])
+        actions = self.mrp_move_obj.search([
+            ('product_id', '=', self.prod_test.id),
+            ('mrp_action', '=', 'po')])
+        weeks = set(
+            fields.Date.from_string(d).isocalendar()[:2]
+            for d in demand.mapped('mrp_date'))
+        self.assertEqual(len(actions), len(weeks))
+        self.assertEqual(
+            sum(actions.mapped('mrp_qty')), -sum(demand.mapped('mrp_qty')))
+
+    def test_13_lot_sizing(self):
+        """Test the fixed order quantity and Wagner-Whitin lot sizings."""
+        self.prod_test.write({
+            'mrp_lot_sizing': 'foq',
+            'mrp_fixed_order_qty': 100.0,
+        })
+        self.mrp_multi_level_wiz.create({}).run_mrp_multi_level()
+        demand = self.mrp_move_obj.search([
+            ('product_id', '=', self.prod_test.id),
+            ('mrp_action', '=', 'none'),
+            ('mrp_type', '=', 'd')])
+        total_demand = -sum(demand.mapped('mrp_qty'))
+        actions = self.mrp_move_obj.search([
+            ('product_id', '=', self.prod_test.id),
+            ('mrp_action', '=', 'po')])
+        for qty in actions.mapped('mrp_qty'):
+            self.assertEqual(qty % 100.0, 0.0)
+        self.assertGreaterEqual(sum(actions.mapped('mrp_qty')), total_demand)
+        self.assertLess(
+            sum(actions.mapped('mrp_qty')) - total_demand, 100.0)
+        # Ordering is much more expensive than holding, a single order:
+        self.prod_test.write({
+            'mrp_lot_sizing': 'ww',
+            'mrp_ordering_cost': 1000000.0,
+            'mrp_holding_cost': 0.01,
+        })
+        self.mrp_multi_level_wiz.create({}).run_mrp_multi_level()
+        actions = self.mrp_move_obj.search([
+            ('product_id', '=', self.prod_test.id),
+            ('mrp_action', '=', 'po')])
+        self.assertEqual(len(actions), 1)
+        self.assertEqual(actions.mrp_qty, total_demand)
+        # Holding is much more expensive than ordering, lot for lot:
+        self.prod_test.mrp_holding_cost = 1000000.0
+        self.mrp_multi_level_wiz.create({}).run_mrp_multi_level()
+        actions = self.mrp_move_obj.search([
+            ('product_id', '=', self.prod_test.id),
+            ('mrp_action', '=', 'po')])
+        self.assertEqual(len(actions), 18)
+
+    def test_14_run_history(self):
+        """Test that the phases of the runs are recorded."""
+        self.mrp_multi_level_wiz.create({}).run_mrp_multi_level()
+        run = self.env['mrp.run'].search([], limit=1)
+        self.assertEqual(run.state, 'done')
+        self.assertFalse(run.net_change)
+        self.assertTrue(run.duration > 0.0)
+        phases = run.phase_ids
+        self.assertEqual(
+            set(phases.mapped('name')),
+            {'llc', 'applicable', 'cleanup', 'initialisation',
+             'calculation', 'final_process'})
+        calculation = phases.filtered(lambda p: p.name == 'calculation')
+        self.assertEqual(len(calculation), 3)  # LLC 0, 1 and 2
+        self.assertTrue(sum(calculation.mapped('records_written')) > 0)
+        self.assertEqual(
+            run.query_count, sum(phases.mapped('query_count')))
+
+    def test_15_bucketed_area(self):
+        """Test the planning of an area in weekly buckets."""
+        domain = [
+            ('product_id', '=', self.prod_test.id),
+            ('mrp_origin', '=', 'fc')]
+        daily_moves = self.mrp_move_obj.search(domain)
+        total_qty = sum(daily_moves.mapped('mrp_qty'))
+        today = fields.Date.from_string(fields.Date.today())
+        buckets = set(
+            max(d - timedelta(days=d.weekday()), today)
+            for d in map(fields.Date.from_string,
+                         daily_moves.mapped('mrp_date')))
+        area = self.env.ref('mrp_multi_level.mrp_area_stock_wh0')
+        area.write({
+            'bucket_size': 'week',
+            'bucket_horizon': 0,
+        })
+        self.mrp_multi_level_wiz.create({}).run_mrp_multi_level()
+        bucket_moves = self.mrp_move_obj.search(domain)
+        self.assertEqual(len(bucket_moves), len(buckets))
+        self.assertEqual(sum(bucket_moves.mapped('mrp_qty')), total_qty)
+        self.assertEqual(
+            set(map(fields.Date.from_string,
+                    bucket_moves.mapped('mrp_date'))), buckets)
+        actions = self.mrp_move_obj.search([
+            ('product_id', '=', self.prod_test.id),
+            ('mrp_action', '=', 'po')])
+        self.assertEqual(len(actions), len(buckets))
+        self.assertEqual(sum(actions.mapped('mrp_qty')), -total_qty)
+
+    def test_16_aggregate_forecast(self):
+        """Test that an aggregated forecast gives the plan of the daily
+        forecast with a single move per estimate."""
+        def get_supply_pegging():
+            res = defaultdict(float)
+            for rec in self.env['mrp.move.pegging'].search([
+                    ('mrp_product_id.product_id', '=', self.prod_test.id)]):
+                supply = rec.supply_move_id
+                res[(supply.mrp_date, supply.mrp_action)] += rec.qty
+            return {key: round(qty, 6) for key, qty in res.items()}
+
+        daily_plan = self._get_plan_snapshot()
+        daily_pegging = get_supply_pegging()
+        area = self.env.ref('mrp_multi_level.mrp_area_stock_wh0')
+        area.aggregate_forecast = True
+        self.mrp_multi_level_wiz.create({}).run_mrp_multi_level()
+        forecast_moves = self.mrp_move_obj.search([
+            ('product_id', '=', self.prod_test.id),
+            ('mrp_origin', '=', 'fc')])
+        self.assertEqual(len(forecast_moves), 3)
+        for move in forecast_moves:
+            self.assertTrue(move.mrp_date_end >= move.mrp_date)
+            # Consumed until its end date, its only demand:
+            inventory = self.mrp_inventory_obj.search([
+                ('mrp_product_id', '=', move.mrp_product_id.id),
+                ('date', '=', move.mrp_date_end)])
+            self.assertAlmostEqual(
+                move.running_availability, inventory.final_on_hand_qty)
+        self.assertEqual(daily_plan, self._get_plan_snapshot())
+        # The supply is pegged to the forecast as it is consumed:
+        self.assertEqual(daily_pegging, get_supply_pegging())
+        actions = self.mrp_move_obj.search([
+            ('product_id', '=', self.prod_test.id),
+            ('mrp_action', '=', 'po')])
+        self.assertEqual(len(actions), 18)
+
+    def test_16_aggregate_forecast_buckets(self):
+        """Test that an aggregated forecast is spread over the days before
+        the buckets only, the buckets having their own move."""
+        domain = [
+            ('product_id', '=', self.prod_test.id),
+            ('mrp_origin', '=', 'fc')]
+        daily_moves = self.mrp_move_obj.search(domain)
+        total_qty = sum(daily_moves.mapped('mrp_qty'))
+        today = fields.Date.from_string(fields.Date.today())
+        bucket_start = today + timedelta(days=3)
+        buckets = set(
+            max(d - timedelta(days=d.weekday()), bucket_start)
+            for d in map(fields.Date.from_string,
+                         daily_moves.mapped('mrp_date'))
+            if d >= bucket_start)
+        area = self.env.ref('mrp_multi_level.mrp_area_stock_wh0')
+        area.write({
+            'bucket_size': 'week',
+            'bucket_horizon': 3,
+        })
+        self.mrp_multi_level_wiz.create({}).run_mrp_multi_level()
+        bucket_plan = self._get_plan_snapshot()
+        area.aggregate_forecast = True
+        self.mrp_multi_level_wiz.create({}).run_mrp_multi_level()
+        moves = self.mrp_move_obj.search(domain)
+        period_moves = moves.filtered('mrp_date_end')
+        bucket_moves = moves - period_moves
+        self.assertTrue(period_moves)
+        for move in period_moves:
+            self.assertTrue(fields.Date.from_string(
+                move.mrp_date_end) < bucket_start)
+        self.assertEqual(
+            set(map(fields.Date.from_string,
+                    bucket_moves.mapped('mrp_date'))), buckets)
+        self.assertAlmostEqual(sum(moves.mapped('mrp_qty')), total_qty)
+        self.assertEqual(bucket_plan, self._get_plan_snapshot())
+
+    def test_17_planning_horizon(self):
+        """Test the planning horizon and the time fences of an area."""
+        domain = [
+            ('product_id', '=', self.prod_test.id),
+            ('mrp_origin', '=', 'fc')]
+        daily_moves = self.mrp_move_obj.search(domain)
+        today = fields.Date.from_string(fields.Date.today())
+        horizon_end = today + timedelta(days=10)
+        area = self.env.ref('mrp_multi_level.mrp_area_stock_wh0')
+        # Aggregated on the last day of the horizon:
+        area.planning_horizon = 10
+        self.mrp_multi_level_wiz.create({}).run_mrp_multi_level()
+        moves = self.mrp_move_obj.search(domain)
+        self.assertEqual(
+            max(map(fields.Date.from_string, moves.mapped('mrp_date'))),
+            horizon_end)
+        self.assertEqual(
+            sum(moves.mapped('mrp_qty')), sum(daily_moves.mapped('mrp_qty')))
+        # Skipped beyond the horizon:
+        area.horizon_policy = 'skip'
+        self.mrp_multi_level_wiz.create({}).run_mrp_multi_level()
+        moves = self.mrp_move_obj.search(domain)
+        self.assertEqual(
+            sum(moves.mapped('mrp_qty')),
+            sum(daily_moves.filtered(
+                lambda m: fields.Date.from_string(
+                    m.mrp_date) <= horizon_end).mapped('mrp_qty')))
+        # No order inside the frozen time fence:
+        area.write({
+            'planning_horizon': 0,
+            'frozen_fence': 5,
+        })
+        self.mrp_multi_level_wiz.create({}).run_mrp_multi_level()
+        actions = self.mrp_move_obj.search([
+            ('product_id', '=', self.prod_test.id),
+            ('mrp_action', '=', 'po')])
+        self.assertTrue(actions)
+        for action in actions:
+            self.assertTrue(fields.Date.from_string(
+                action.mrp_date) >= today + timedelta(days=5))
+        # Lot for lot inside the slushy time fence:
+        self.prod_test.mrp_lot_sizing = 'foq'
+        self.prod_test.mrp_fixed_order_qty = 1000.0
+        area.write({
+            'frozen_fence': 0,
+            'slushy_fence': 7,
+        })
+        self.mrp_multi_level_wiz.create({}).run_mrp_multi_level()
+        actions = self.mrp_move_obj.search([
+            ('product_id', '=', self.prod_test.id),
+            ('mrp_action', '=', 'po')])
+        fence = fields.Date.to_string(today + timedelta(days=7))
+        slushy_actions = actions.filtered(lambda m: m.mrp_date < fence)
+        self.assertEqual(len(slushy_actions), 7)
+        self.assertEqual((actions - slushy_actions).mapped('mrp_qty'),
+                         [1000.0])
+
+    def test_18_supply_method_batch(self):
+        """Test that the supply methods resolved once per routes and area
+        are the ones of the rule of every product."""
+        mrp_products = self.mrp_product_obj.search([])
+        group_obj = self.env['procurement.group']
+        for mrp_product in mrp_products:
+            rule = group_obj._get_rule(
+                mrp_product.product_id, mrp_product.mrp_area_id.location_id,
+                {'warehouse_id': mrp_product.mrp_area_id.warehouse_id,
+                 'company_id': self.env.user.company_id.id})
+            self.assertEqual(
+                mrp_product.supply_method, rule.action if rule else 'none')
+        buy_products = mrp_products.filtered(
+            lambda r: r.supply_method == 'buy')
+        self.assertIn(self.prod_test, buy_products.mapped('product_id'))
+        self.assertIn(self.prod_min, buy_products.mapped('product_id'))
+        for mrp_product in buy_products.filtered(
+                lambda r: r.product_id.seller_ids):
+            self.assertEqual(
+                mrp_product.main_supplierinfo_id,
+                mrp_product.product_id.seller_ids[0])
+
+    def test_19_create_moves_with_pegging(self):
+        """Test the creation of MRP moves linked in bulk."""
+        mrp_product = self.mrp_product_obj.search([
+            ('product_id', '=', self.sf_1.id)])
+        vals = {
+            'mrp_area_id': mrp_product.mrp_area_id.id,
+            'product_id': mrp_product.product_id.id,
+            'mrp_product_id': mrp_product.id,
+            'mrp_date': fields.Date.today(),
+            'mrp_type': 's',
+        }
+        vals_list = [dict(vals, mrp_qty=qty) for qty in (1.0, 2.0, 3.0)]
+        moves = self.mrp_move_obj._create_with_pegging(
+            vals_list, pegging=[(0, 1), (0, 2)])
+        self.assertEqual(moves.mapped('mrp_qty'), [1.0, 2.0, 3.0])
+        self.assertEqual(moves[0].mrp_move_down_ids, moves[1:])
+        self.assertEqual(moves[2].mrp_move_up_ids, moves[0])
+
+    def test_20_pegging(self):
+        """Test the pegging of the demand to the supply and components."""
+        demand = self.mrp_move_obj.search([
+            ('product_id', '=', self.fp_1.id),
+            ('mrp_type', '=', 'd')])
+        self.assertEqual(len(demand), 1)
+        self.assertEqual(len(demand.demand_pegging_ids), 1)
+        pegging = demand.demand_pegging_ids
+        self.assertEqual(pegging.qty, 100.0)
+        self.assertEqual(pegging.supply_move_id.mrp_action, 'mo')
+        down = demand.trace_down()
+        self.assertIn(pegging.supply_move_id, down)
+        self.assertEqual(
+            set(down.mapped('product_id').ids),
+            {self.fp_1.id, self.pp_1.id, self.pp_2.id})
+        component_demand = down.filtered(
+            lambda m: m.product_id == self.pp_1 and m.mrp_type == 'd')
+        self.assertTrue(component_demand)
+        self.assertIn(demand, component_demand.trace_up())
+        action = demand.action_view_pegging()
+        self.assertEqual(
+            self.mrp_move_obj.search(action['domain']), demand | down)
+
+    def test_21_background_run(self):
+        """Test an MRP run processed by chunks in the background."""
+        plan = self._get_plan_snapshot()
+        action = self.mrp_multi_level_wiz.create({
+            'background': True,
+        }).run_mrp_multi_level()
+        run = self.env['mrp.run'].browse(action['res_id'])
+        self.assertEqual(run.state, 'queued')
+        self.assertEqual(run.chunk_ids.mapped('name'), ['prepare'])
+        # Failed runs are not processed until resumed:
+        run.write({'state': 'failed', 'error': 'Test'})
+        self.assertFalse(self.env['mrp.run']._cron_process_runs())
+        self.assertEqual(run.state, 'failed')
+        run.action_resume()
+        self.assertEqual(run.state, 'queued')
+        self.assertFalse(run.error)
+        self.assertTrue(self.env['mrp.run']._cron_process_runs())
+        self.assertEqual(run.state, 'done')
+        self.assertEqual(run.progress, 100.0)
+        self.assertEqual(
+            set(run.chunk_ids.mapped('name')),
+            {'prepare', 'initialisation', 'calculation'})
+        self.assertFalse(run.chunk_ids.filtered(
+            lambda c: c.state != 'done'))
+        self.assertEqual(plan, self._get_plan_snapshot())
+        # Cancelled runs cannot be resumed:
+        action = self.mrp_multi_level_wiz.create({
+            'background': True,
+        }).run_mrp_multi_level()
+        run = self.env['mrp.run'].browse(action['res_id'])
+        run.action_cancel()
+        self.assertFalse(self.env['mrp.run']._cron_process_runs())
+        self.assertEqual(run.state, 'cancelled')
+        with self.assertRaises(UserError):
+            run.action_resume()
+
+    def test_22_plan_generations(self):
+        """Test that a run writes a new plan generation, read only once it
+        is done, and that the previous one is garbage collected."""
+        plan = self._get_plan_snapshot()
+        previous = self.mrp_product_obj._get_current_mrp_generation()
+        nbr_products = self.mrp_product_obj.search_count([])
+        self.mrp_multi_level_wiz.create({}).run_mrp_multi_level()
+        run = self.env['mrp.run'].search([], limit=1)
+        current = self.mrp_product_obj._get_current_mrp_generation()
+        self.assertEqual(run.generation, current)
+        self.assertGreater(current, previous)
+        self.assertEqual(self.mrp_product_obj.search_count([]), nbr_products)
+        self.assertEqual(set(self.mrp_move_obj.search([]).mapped(
+            'generation')), {current})
+        self.assertEqual(plan, self._get_plan_snapshot())
+        # The previous plan is kept until garbage collected:
+        self.assertEqual(self.mrp_product_obj.search_count([
+            ('generation', '=', previous)]), nbr_products)
+        self.mrp_multi_level_wiz._mrp_gc_generations()
+        self.assertFalse(self.mrp_product_obj.search([
+            ('generation', '=', previous)]))
+        self.assertFalse(self.mrp_inventory_obj.search([
+            ('generation', '=', previous)]))
+        self.assertEqual(self.mrp_product_obj.search_count([]), nbr_products)
+        # A net change run writes a new generation too, the products it
+        # does not plan again being copied from the current one:
+        moves = self._get_moves_snapshot()
+        current_mrp_products = self.mrp_product_obj.search([])
+        self._run_net_change(self.po.order_line)
+        run = self.env['mrp.run'].search([], limit=1)
+        net_change = self.mrp_product_obj._get_current_mrp_generation()
+        self.assertEqual(run.generation, net_change)
+        self.assertGreater(net_change, current)
+        self.assertTrue(run.product_ids)
+        mrp_products = self.mrp_product_obj.search([])
+        self.assertEqual(len(mrp_products), nbr_products)
+        self.assertFalse(mrp_products & current_mrp_products)
+        self.assertEqual(
+            mrp_products.filtered(
+                lambda p: p.product_id not in run.product_ids).mapped(
+                'product_id'),
+            current_mrp_products.filtered(
+                lambda p: p.product_id not in run.product_ids).mapped(
+                'product_id'))
+        self.assertEqual(self.mrp_product_obj.search_count([
+            ('generation', '=', current)]), nbr_products)
+        self.assertEqual(plan, self._get_plan_snapshot())
+        self.assertEqual(moves, self._get_moves_snapshot())
+
+    def test_23_bulk_create(self):
+        """Test that the bulk creation gives the records the ORM creates,
+        defaults and stored computed fields included."""
+        area = self.env.ref('mrp_multi_level.mrp_area_stock_wh0')
+        wizard = self.mrp_multi_level_wiz
+        for model_name, vals in [
+            ('mrp.product',
+             wizard._prepare_mrp_product_data(self.pp_1, area)),
+            ('mrp.move', wizard._prepare_mrp_move_data_supply(
+                self.mrp_product_obj.search([
+                    ('product_id', '=', self.pp_1.id)]),
+                10.0, fields.Date.today(), fields.Date.today(), 'po',
+                'Test')),
+        ]:
+            model = self.env[model_name]
+            fnames = [fname for fname, field in model._fields.items()
+                      if field.store and fname not in models.MAGIC_COLUMNS]
+            bulk = wizard._bulk_create(model_name, [dict(vals)])
+            orm = model.create(dict(vals))
+            bulk_vals = bulk.read(fnames)[0]
+            orm_vals = orm.read(fnames)[0]
+            del bulk_vals['id'], orm_vals['id']
+            self.assertEqual(bulk_vals, orm_vals)
+
+    def test_24_net_change_queue(self):
+        """Test that a net change run plans again the products of the
+        deleted records and of the changed MRP areas, that no modification
+        date tells about."""
+        param_obj = self.env['ir.config_parameter'].sudo()
+        tomorrow = fields.Datetime.to_string(
+            datetime.now() + timedelta(days=1))
+        wizard = self.mrp_multi_level_wiz
+        # Deleted demand estimate:
+        self.estimate_obj.search([
+            ('product_id', '=', self.prod_test.id)], limit=1).unlink()
+        param_obj.set_param('mrp_multi_level.last_run_date', tomorrow)
+        wizard.create({'net_change': True}).run_mrp_multi_level()
+        self.assertFalse(self.env['mrp.net.change'].search([]))
+        net_change_plan = self._get_plan_snapshot()
+        wizard.create({}).run_mrp_multi_level()
+        self.assertEqual(net_change_plan, self._get_plan_snapshot())
+        # Changed MRP area:
+        area = self.env.ref('mrp_multi_level.mrp_area_stock_wh0')
+        area.planning_horizon = 10
+        param_obj.set_param('mrp_multi_level.last_run_date', tomorrow)
+        wizard.create({'net_change': True}).run_mrp_multi_level()
+        moves = self.mrp_move_obj.search([
+            ('product_id', '=', self.prod_test.id),
+            ('mrp_origin', '=', 'fc')])
+        self.assertEqual(
+            max(map(fields.Date.from_string, moves.mapped('mrp_date'))),
+            fields.Date.from_string(fields.Date.today()) +
+            timedelta(days=10))
+        net_change_plan = self._get_plan_snapshot()
+        wizard.create({}).run_mrp_multi_level()
+        self.assertEqual(net_change_plan, self._get_plan_snapshot())
+
+    def test_25_parallel_area_worker(self):
+        """Test the planning of an MRP area in its own transaction, as the
+        parallel runs do in every thread."""
+        plan = self._get_plan_snapshot()
+        area = self.env.ref('mrp_multi_level.mrp_area_stock_wh0')
+        generation = self.env['mrp.run']._next_generation()
+        wizard = self.mrp_multi_level_wiz.with_context(
+            mrp_generation=generation)
+        mrp_lowest_llc = wizard._low_level_code_calculation()
+        # The new cursor of the worker shares the transaction of the test.
+        self.registry.enter_test_mode(self.cr)
+        try:
+            wizard._mrp_run_area_worker(area.id, mrp_lowest_llc)
+        finally:
+            self.registry.leave_test_mode()
+        self.env.invalidate_all()
+        self.assertTrue(self.mrp_product_obj.search([
+            ('generation', '=', generation)]))
+        wizard._mrp_final_process()
+        wizard._set_mrp_generation(generation)
+        self.assertEqual(plan, self._get_plan_snapshot())
+        # Without MRP area, there is nothing to plan in parallel:
+        run = self.env['mrp.run'].create({'parallel': True})
+        wizard._mrp_run_parallel(
+            run, self.env['mrp.area'], mrp_lowest_llc)
+        self.assertEqual(run.state, 'running')
+
+    def test_26_unreserved_qty(self):
+        """Test that the reserved quantities are not available to the MRP
+        areas that only consider the unreserved ones."""
+        picking = self.stock_picking_obj.create({
+            'picking_type_id': self.env.ref('stock.picking_type_out').id,
+            'location_id': self.stock_location.id,
+            'location_dest_id': self.customer_location.id,
+            'move_lines': [(0, 0, {
+                'name': 'Test move pp-1',
+                'product_id': self.pp_1.id,
+                'date_expected': fields.Datetime.now(),
+                'product_uom': self.pp_1.uom_id.id,
+                'product_uom_qty': 4.0,
+                'location_id': self.stock_location.id,
+                'location_dest_id': self.customer_location.id,
+            })],
+        })
+        picking.action_confirm()
+        picking.action_assign()
+        self.assertEqual(picking.move_lines.reserved_availability, 4.0)
+        domain = [('product_id', '=', self.pp_1.id),
+                  ('mrp_action', '=', 'po')]
+        self.mrp_multi_level_wiz.create({}).run_mrp_multi_level()
+        mrp_product = self.mrp_product_obj.search([
+            ('product_id', '=', self.pp_1.id)])
+        self.assertEqual(mrp_product.mrp_qty_available, 10.0)
+        supply_qty = sum(self.mrp_move_obj.search(domain).mapped('mrp_qty'))
+        area = self.env.ref('mrp_multi_level.mrp_area_stock_wh0')
+        area.unreserved_qty = True
+        self.mrp_multi_level_wiz.create({}).run_mrp_multi_level()
+        mrp_product = self.mrp_product_obj.search([
+            ('product_id', '=', self.pp_1.id)])
+        self.assertEqual(mrp_product.mrp_qty_available, 6.0)
+        inventory = self.mrp_inventory_obj.search([
+            ('mrp_product_id', '=', mrp_product.id)], limit=1)
+        self.assertEqual(inventory.initial_on_hand_qty, 6.0)
+        self.assertEqual(
+            sum(self.mrp_move_obj.search(domain).mapped('mrp_qty')),
+            supply_qty + 4.0)
+
+    def test_27_late_demand(self):
+        """Test that the supply of a demand required before today is
+        received today, and ordered on the date the demand requires."""
+        area = self.env.ref('mrp_multi_level.mrp_area_stock_wh0')
+        wizard = self.mrp_multi_level_wiz
+        area_context = wizard._get_mrp_area_context(area)
+        mrp_product = self.mrp_product_obj.search([
+            ('product_id', '=', self.prod_test.id)])
+        today = fields.Date.from_string(fields.Date.today())
+        mrp_date = today - timedelta(days=3)
+        buffer = MrpMoveBuffer()
+        wizard._plan_supply(mrp_product, mrp_date, 10.0, 'Late', buffer,
+                            area_context=area_context)
+        vals = buffer.vals_list[0]
+        self.assertEqual(vals['mrp_date'], today)
+        self.assertEqual(
+            vals['mrp_action_date'],
+            wizard._get_mrp_action_date(
+                mrp_product, mrp_date, area_context=area_context))
+        self.assertLess(vals['mrp_action_date'], mrp_date)
+
+    def test_28_horizon_before_buckets(self):
+        """Test that the moves aggregated on a planning horizon ending
+        before the bucket horizon are netted at once."""
+        area = self.env.ref('mrp_multi_level.mrp_area_stock_wh0')
+        area.write({
+            'bucket_size': 'week',
+            'bucket_horizon': 30,
+            'planning_horizon': 10,
+        })
+        area_context = self.mrp_multi_level_wiz._get_mrp_area_context(area)
+        horizon_end = area_context.horizon_end
+        moves = [
+            (horizon_end - timedelta(days=1), -1.0, 'Day before'),
+            (horizon_end, -2.0, 'Horizon'),
+            (horizon_end, -3.0, 'Horizon'),
+        ]
+        merged = self.mrp_multi_level_wiz._merge_mrp_bucket_moves(
+            moves, area_context=area_context)
+        self.assertEqual(len(merged), 2)
+        self.assertEqual(merged[0], moves[0])
+        self.assertEqual(merged[1][:2], (horizon_end, -5.0))
+
+    def test_29_background_net_change(self):
+        """Test that a background net change run leaves the current plan
+        untouched until it is done, and gives the same plan than a full
+        regeneration."""
+        plan = self._get_plan_snapshot()
+        moves = self._get_moves_snapshot()
+        current = self.mrp_product_obj._get_current_mrp_generation()
+        self.po.order_line.product_qty = 50.0
+        action = self._run_net_change(
+            self.po.order_line, background=True)
+        run = self.env['mrp.run'].browse(action['res_id'])
+        # One chunk per call:
+        while not self.env['mrp.run']._cron_process_runs(time_limit=1e-6):
+            self.assertEqual(run.state, 'running')
+            self.assertEqual(
+                self.mrp_product_obj._get_current_mrp_generation(), current)
+            self.assertEqual(plan, self._get_plan_snapshot())
+            self.assertEqual(moves, self._get_moves_snapshot())
+        self.assertEqual(run.state, 'done')
+        self.assertTrue(run.net_change)
+        self.assertIn(self.pp_2, run.product_ids)
+        self.assertFalse(run.product_ids & (self.fp_1 | self.sf_1))
+        self.assertEqual(
+            self.mrp_product_obj._get_current_mrp_generation(),
+            run.generation)
+        net_change_plan = self._get_plan_snapshot()
+        net_change_moves = self._get_moves_snapshot()
+        self.assertNotEqual(plan, net_change_plan)
+        self.mrp_multi_level_wiz.create({}).run_mrp_multi_level()
+        self.assertEqual(net_change_plan, self._get_plan_snapshot())
+        self.assertEqual(net_change_moves, self._get_moves_snapshot())
+
+    def test_30_gc_failed_runs(self):
+        """Test that the plan written by a failed run is garbage collected,
+        unless the run can be resumed in the background, until it is
+        discarded."""
+        area = self.env.ref('mrp_multi_level.mrp_area_stock_wh0')
+        wizard = self.mrp_multi_level_wiz
+        runs = self.env['mrp.run']
+        for background in (False, True):
+            generation = runs._next_generation()
+            wizard.with_context(
+                mrp_generation=generation)._mrp_initialisation_area(area)
+            runs |= runs.create({
+                'state': 'failed',
+                'background': background,
+                'generation': generation,
+            })
+        sync_run, background_run = runs
+        wizard._mrp_gc_generations()
+        self.assertFalse(self.mrp_product_obj.search([
+            ('generation', '=', sync_run.generation)]))
+        self.assertFalse(self.mrp_move_obj.search([
+            ('generation', '=', sync_run.generation)]))
+        self.assertTrue(self.mrp_product_obj.search([
+            ('generation', '=', background_run.generation)]))
+        with self.assertRaises(UserError):
+            sync_run.action_discard()
+        background_run.action_discard()
+        self.assertEqual(background_run.state, 'cancelled')
+        wizard._mrp_gc_generations()
+        self.assertFalse(self.mrp_product_obj.search([
+            ('generation', '=', background_run.generation)]))
+        self.assertTrue(self.mrp_product_obj.search([]))
+
+    def test_31_net_change_queue_sources(self):
+        """Test that the changes of the suppliers, of the routes of the
+        product categories and of the calendars of the warehouses are
+        queued for the next net change run."""
+        net_change_obj = self.env['mrp.net.change']
+        net_change_obj.search([]).unlink()
+        area = self.env.ref('mrp_multi_level.mrp_area_stock_wh0')
+        # Supplier:
+        self.prod_min.seller_ids.write({'delay': 10})
+        self.assertEqual(
+            net_change_obj.search([]).mapped('product_id'), self.prod_min)
+        net_change_obj.search([]).unlink()
+        self.prod_min.seller_ids.unlink()
+        self.assertEqual(
+            net_change_obj.search([]).mapped('product_id'), self.prod_min)
+        net_change_obj.search([]).unlink()
+        # Routes of a product category:
+        self.prod_test.categ_id.write({'route_ids': [(5, 0, 0)]})
+        self.assertIn(
+            self.prod_test, net_change_obj.search([]).mapped('product_id'))
+        net_change_obj.search([]).unlink()
+        # Calendar of a warehouse:
+        self.wh.calendar_id = False
+        self.assertEqual(
+            net_change_obj.search([]).mapped('mrp_area_id'), area)
+        net_change_obj.search([]).unlink()
+        self.calendar.write({'name': 'Changed Hours'})
+        self.assertFalse(net_change_obj.search([]))
+        self.wh.calendar_id = self.calendar
+        net_change_obj.search([]).unlink()
+        self.calendar.write({'name': 'Changed Hours'})
+        self.assertEqual(
+            net_change_obj.search([]).mapped('mrp_area_id'), area)
+
+    def test_32_mrp_applicable_unchanged(self):
+        """Test that the products whose MRP applicability does not change
+        are not written, the net change runs reading their modification
+        date."""
+        wizard = self.mrp_multi_level_wiz
+
+        def filter_mrp_applicable(self, products):
+            return products - self.env.ref(
+                'mrp_multi_level.product_product_pp_1')
+
+        self.cr.execute("""
+            UPDATE product_product SET write_date = '2000-01-01 00:00:00'
+            WHERE id IN %s""", ((self.pp_1.id, self.pp_2.id),))
+        self.product_obj.invalidate_cache()
+        with patch.object(type(wizard), '_filter_mrp_applicable',
+                          filter_mrp_applicable):
+            wizard._calculate_mrp_applicable()
+            self.assertFalse(self.pp_1.mrp_applicable)
+            self.cr.execute("""
+                UPDATE product_product
+                SET write_date = '2000-01-01 00:00:00' WHERE id = %s""",
+                            (self.pp_1.id,))
+            self.product_obj.invalidate_cache()
+            wizard._calculate_mrp_applicable()
+        self.assertFalse(self.pp_1.mrp_applicable)
+        self.assertEqual(self.pp_1.write_date, '2000-01-01 00:00:00')
+        self.assertTrue(self.pp_2.mrp_applicable)
+        self.assertEqual(self.pp_2.write_date, '2000-01-01 00:00:00')
 
     # TODO: test procure wizard: pos, multiple...
     # TODO: test multiple destination IDS:...
@@ -0,0 +1,119 @@
+# Copyright 2018 Eficent Business and IT Consulting Services S.L.
+#   (http://www.eficent.com)
+# License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl.html).
+
+from datetime import datetime, timedelta
+import logging
+import os
+import time
+
+from odoo import fields
+from odoo.tests.common import SavepointCase
+
+from .mrp_benchmark_data import MrpBenchmarkCatalogue
+
+logger = logging.getLogger(__name__)
+
+
+def _get_benchmark_parameter(name, default):
+    return int(os.environ.get('MRP_BENCHMARK_%s' % name.upper(), default))
+
+
+class TestMrpMultiLevelBenchmark(SavepointCase):
+    """Time the MRP run on a synthetic catalogue and check that the
+    different ways of running it give the same plan.
+
+    The catalogue is small by default to keep the test suite fast. Set the
+    MRP_BENCHMARK_PRODUCTS, MRP_BENCHMARK_DEPTH, MRP_BENCHMARK_FAN_OUT,
+    MRP_BENCHMARK_AREAS, MRP_BENCHMARK_MOVES and MRP_BENCHMARK_SEED
+    environment variables to benchmark larger ones. The timings are logged
+    and kept in the MRP run history.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super(TestMrpMultiLevelBenchmark, cls).setUpClass()
+        cls.mrp_multi_level_wiz = cls.env['mrp.multi.level']
+        cls.mrp_inventory_obj = cls.env['mrp.inventory']
+        cls.mrp_move_obj = cls.env['mrp.move']
+        cls.catalogue = MrpBenchmarkCatalogue(
+            cls.env,
+            products=_get_benchmark_parameter('products', 60),
+            depth=_get_benchmark_parameter('depth', 3),
+            fan_out=_get_benchmark_parameter('fan_out', 3),
+            areas=_get_benchmark_parameter('areas', 1),
+            moves=_get_benchmark_parameter('moves', 60),
+            seed=_get_benchmark_parameter('seed', 1),
+        ).build()
+
+    def _run_mrp(self, label, **vals):
+        start = time.time()
+        self.mrp_multi_level_wiz.create(vals).run_mrp_multi_level()
+        duration = time.time() - start
+        run = self.env['mrp.run'].search([], limit=1)
+        nbr_products = self.env['mrp.product'].search_count([])
+        logger.info(
+            'MRP BENCHMARK %s: %.3fs, %s MRP products (%.1f/s), '
+            '%s queries, %s records written, %.1f MB process peak memory',
+            label, duration, nbr_products,
+            nbr_products / duration if duration else 0.0,
+            run.query_count, run.records_written, run.process_peak_memory)
+        for phase in run.phase_ids:
+            logger.info(
+                'MRP BENCHMARK %s: %s %s LLC %s: %.3fs, %s queries, '
+                '%s records written', label, phase.name,
+                phase.mrp_area_id.name or '', phase.llc, phase.duration,
+                phase.query_count, phase.records_written)
+        return run
+
+    def _get_plan_snapshot(self):
+        """Return the plan of the MRP areas, independent of the ids of the
+        MRP records."""
+        inventory = sorted(
+            (inv.mrp_area_id.id, inv.mrp_product_id.product_id.id, inv.date,
+             round(inv.demand_qty, 6), round(inv.supply_qty, 6),
+             round(inv.to_procure, 6), round(inv.final_on_hand_qty, 6))
+            for inv in self.mrp_inventory_obj.search([]))
+        actions = sorted(
+            (move.mrp_area_id.id, move.product_id.id, move.mrp_date,
+             move.mrp_action_date, move.mrp_action, round(move.mrp_qty, 6))
+            for move in self.mrp_move_obj.search([
+                ('mrp_action', '!=', 'none')]))
+        return inventory, actions
+
+    def test_01_regeneration(self):
+        """Two regenerations of the same data give the same plan."""
+        self._run_mrp('REFERENCE')
+        reference = self._get_plan_snapshot()
+        self.assertTrue(reference[0])
+        self._run_mrp('REGENERATION')
+        self.assertEqual(reference, self._get_plan_snapshot())
+
+    def test_02_net_change(self):
+        """A net change run after changing some supply only plans again the
+        changed products, and gives the plan of a regeneration."""
+        self._run_mrp('REFERENCE')
+        lines = self.env['purchase.order.line'].search([
+            ('product_id', 'in',
+             [product.id for product in self.catalogue.levels[-1]])],
+            limit=3)
+        for line in lines:
+            line.product_qty += 10.0
+        # The records written by the test transaction are all dated when it
+        # started, as the last run: only the changed lines are dated after
+        # the last run.
+        last_run_date = datetime.now() + timedelta(days=1)
+        self.env['ir.config_parameter'].sudo().set_param(
+            'mrp_multi_level.last_run_date',
+            fields.Datetime.to_string(last_run_date))
+        self.env.cr.execute("""
+            UPDATE purchase_order_line SET write_date = %s WHERE id IN %s
+        """, (fields.Datetime.to_string(last_run_date + timedelta(hours=1)),
+              tuple(lines.ids)))
+        run = self._run_mrp('NET CHANGE', net_change=True)
+        logger.info('MRP BENCHMARK NET CHANGE: %s products planned again',
+                    len(run.product_ids))
+        self.assertEqual(run.product_ids, lines.mapped('product_id'))
+        net_change = self._get_plan_snapshot()
+        self._run_mrp('REGENERATION')
+        self.assertEqual(net_change, self._get_plan_snapshot())
@@ -4,38 +4,303 @@
 # License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl.html).
 
 from odoo import api, fields, models, exceptions, _
+from odoo.exceptions import UserError
 from odoo.tools import DEFAULT_SERVER_DATETIME_FORMAT
-from odoo.tools import DEFAULT_SERVER_DATE_FORMAT
+from bisect import bisect_right
+from collections import defaultdict, deque, namedtuple
+from contextlib import contextmanager
 from datetime import date, datetime, timedelta
-import locale
+from dateutil.relativedelta import relativedelta
+from functools import partial
+from itertools import accumulate, groupby
+from math import ceil, sqrt
+from operator import itemgetter
 import logging
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from odoo.tools.float_utils import float_round
+from odoo.addons.mrp_multi_level.models.mrp_plan_mixin import \
+    BULK_INSERT_SIZE
 logger = logging.getLogger(__name__)
 
-ODOO_READ_GROUP_DAY_FORMAT = '%d %b %Y'
+if os.name == 'posix':
+    import resource
+else:
+    resource = None
+
+# Number of MRP products planned by a chunk of a background run.
+MRP_RUN_CHUNK_SIZE = 500
+
+# Seconds before the start of the last MRP run from which a net change run
+# takes the changes, by default: the transactions running when it started
+# may have committed their changes after it read the data.
+NET_CHANGE_MARGIN = 600
+
+GROUPING_PERIOD_LABELS = {
+    'day': 'Days',
+    'week': 'Weeks',
+    'month': 'Months',
+}
+
+BomExplosionLine = namedtuple('BomExplosionLine', [
+    'bom', 'bomline',
+    # Id of the MRP product of the component in the MRP area.
+    'mrp_product_id',
+    # Quantity of component per unit of the parent.
+    'qty',
+    # Days between the parent's order release and the component's demand.
+    'offset_days',
+])
+
+
+class MrpMoveBuffer(object):
+    """Planned supply moves and the demand moves they explode to, kept in
+    memory until they are written in the database at once."""
+
+    def __init__(self):
+        self.vals_list = []
+        # (index of the supply move, index of the demand move) in vals_list
+        self.pegging = []
+
+    def add_supply(self, vals):
+        self.vals_list.append(vals)
+        return len(self.vals_list) - 1
+
+    def add_demand(self, supply_index, vals):
+        if vals:
+            self.vals_list.append(vals)
+            self.pegging.append((supply_index, len(self.vals_list) - 1))
+
+    def clear(self):
+        self.__init__()
+
+
+class MrpAreaContext(object):
+    """Data of an MRP area resolved once per MRP run and shared by all the
+    methods initialising and planning the products of the area."""
+
+    def __init__(self, mrp_area, location_ids, picking_type_ids, calendar):
+        self.mrp_area = mrp_area
+        # Ids of the area location and all its children.
+        self.location_ids = location_ids
+        # Ids of the picking types delivering in these locations.
+        self.picking_type_ids = picking_type_ids
+        self.calendar = calendar
+        # Quantity available in the area locations, by product id.
+        self.qty_available = {}
+        # BoM explosion of the manufactured products, by product id.
+        self.bom_explosion = {}
+        # MRP product id of the products in the area, by product id. Loaded
+        # once the MRP products of the area are initialised.
+        self.mrp_product_index = None
+        # First date planned in buckets, None if the area is planned day by
+        # day.
+        self.bucket_start = None
+        if mrp_area.bucket_size != 'day':
+            self.bucket_start = date.today() + timedelta(
+                days=mrp_area.bucket_horizon)
+        # Last date planned, None without horizon.
+        self.horizon_end = None
+        if mrp_area.planning_horizon > 0:
+            self.horizon_end = date.today() + timedelta(
+                days=mrp_area.planning_horizon)
+        # First dates outside of the frozen and slushy time fences.
+        self.frozen_end = date.today() + timedelta(
+            days=max(mrp_area.frozen_fence, 0))
+        self.slushy_end = date.today() + timedelta(
+            days=max(mrp_area.slushy_fence, 0))
+
+    @property
+    def skip_beyond_horizon(self):
+        return self.horizon_end is not None and \
+            self.mrp_area.horizon_policy == 'skip'
+
+
+def get_process_peak_memory():
+    """Return the peak resident memory of the server process since it
+    started, in megabytes, or 0.0 where it cannot be read."""
+    if resource is None:
+        return 0.0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, kilobytes on the other systems.
+    if sys.platform == 'darwin':
+        peak /= 1024.0
+    return peak / 1024.0
+
+
+class MrpRunProfiler(object):
+    """Measure the phases of an MRP run: wall time, SQL queries, records
+    written, and peak memory of the server process at their end. Phases can
+    be measured from several threads, each with its own cursor."""
+
+    def __init__(self):
+        self.phases = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @property
+    def records_written(self):
+        """Number of rows inserted or updated so far by the current thread."""
+        return getattr(self._local, 'records_written', 0)
+
+    def add_records_written(self, nbr):
+        self._local.records_written = self.records_written + nbr
+
+    @contextmanager
+    def phase(self, cr, name, mrp_area=None, llc=None):
+        """Measure the phase ``name`` run by the block, with the SQL queries
+        executed on ``cr``."""
+        date_start = fields.Datetime.now()
+        start = time.time()
+        query_count = cr.sql_log_count
+        records_written = self.records_written
+        yield
+        vals = {
+            'name': name,
+            'mrp_area_id': mrp_area.id if mrp_area else False,
+            'llc': llc or 0,
+            'date_start': date_start,
+            'duration': time.time() - start,
+            'query_count': cr.sql_log_count - query_count,
+            'records_written': self.records_written - records_written,
+            'process_peak_memory': get_process_peak_memory(),
+        }
+        with self._lock:
+            vals['sequence'] = len(self.phases) + 1
+            self.phases.append(vals)
 
 
 class MultiLevelMrp(models.TransientModel):
     _name = 'mrp.multi.level'
 
+    parallel = fields.Boolean(
+        string='Parallel Run',
+        help="Plan every MRP area in its own thread and transaction, each "
+             "area being committed as soon as it is planned.",
+    )
+    net_change = fields.Boolean(
+        string='Net Change',
+        help="Only recompute the products affected by the changes made "
+             "since the last MRP run (stock moves, purchase orders, bills "
+             "of materials, demand estimates and MRP parameters) and their "
+             "components, leaving the rest of the plan untouched.",
+    )
+    background = fields.Boolean(
+        string='Run in Background',
+        help="Queue the run to be processed by chunks by a scheduled "
+             "action, every chunk being committed on its own. Its progress "
+             "is shown on the MRP run, that can be cancelled, and resumed "
+             "after a failure.",
+    )
+
     # TODO: dates are not being correctly computed for supply...
 
     @api.model
-    def _prepare_mrp_product_data(self, product, mrp_area):
-        qty_available = 0.0
-        product_obj = self.env['product.product']
-        # TODO: move mrp_qty_available computation, maybe unreserved??
-        location_ids = self.env['stock.location'].search(
+    def _get_mrp_area_context(self, mrp_area):
+        """Resolve the locations, picking types and calendar of
+        ``mrp_area`` once for the whole MRP run."""
+        locations = self.env['stock.location'].search(
             [('id', 'child_of', mrp_area.location_id.id)])
-        for location in location_ids:
-            product_l = product_obj.with_context(
-                {'location': location.id}).browse(product.id)
-            qty_available += product_l.qty_available
+        picking_types = self.env['stock.picking.type'].search(
+            [('default_location_dest_id', 'in', locations.ids)])
+        return MrpAreaContext(
+            mrp_area, locations.ids, picking_types.ids,
+            mrp_area.calendar_id)
+
+    @api.model
+    def _get_mrp_bucket_date(self, mrp_date, area_context=None):
+        """Return the date ``mrp_date`` is planned on in the MRP area of
+        ``area_context``: the first day of its bucket beyond the bucket
+        horizon, ``mrp_date`` itself before. Dates beyond the planning
+        horizon are planned on its last day."""
+        if area_context is None:
+            return mrp_date
+        if area_context.horizon_end is not None and \
+                mrp_date > area_context.horizon_end:
+            return area_context.horizon_end
+        if area_context.bucket_start is None or \
+                mrp_date < area_context.bucket_start:
+            return mrp_date
+        bucket_size = area_context.mrp_area.bucket_size
+        if bucket_size == 'week':
+            bucket_date = mrp_date - timedelta(days=mrp_date.weekday())
+        elif bucket_size == 'month':
+            bucket_date = mrp_date.replace(day=1)
+        else:
+            return mrp_date
+        return max(bucket_date, area_context.bucket_start)
 
+    @api.model
+    def _set_mrp_bucket_dates(self, vals_list, area_context=None):
+        """Move the MRP dates of the moves ``vals_list`` to their bucket."""
+        if area_context is None or (area_context.bucket_start is None and
+                                    area_context.horizon_end is None):
+            return vals_list
+        for vals in vals_list:
+            if vals.get('mrp_date'):
+                vals['mrp_date'] = self._get_mrp_bucket_date(
+                    vals['mrp_date'], area_context)
+        return vals_list
+
+    @api.model
+    def _merge_mrp_bucket_moves(self, moves, area_context=None):
+        """Merge the sorted ``moves`` to net that fall in a same bucket, so
+        that their net requirement is planned at once. The moves aggregated
+        on the planning horizon are a bucket too."""
+        if area_context is None:
+            return moves
+        starts = [start for start in (area_context.bucket_start,
+                                      area_context.horizon_end)
+                  if start is not None]
+        if not starts:
+            return moves
+        # The planning horizon can end before the bucket horizon.
+        bucket_start = min(starts)
+        merged = []
+        for mrp_date, mrp_qty, name in moves:
+            if mrp_date >= bucket_start and merged and \
+                    merged[-1][0] == mrp_date:
+                merged[-1] = (mrp_date, merged[-1][1] + mrp_qty,
+                              'Bucket %s' % fields.Date.to_string(mrp_date))
+            else:
+                merged.append((mrp_date, mrp_qty, name))
+        return merged
+
+    @api.model
+    def _get_mrp_qty_available(self, products, area_context):
+        """Return the quantity on hand of ``products`` in the locations of
+        the MRP area, by product id, reading all the quants at once."""
+        res = dict.fromkeys(products.ids, 0.0)
+        if not products:
+            return res
+        groups = self.env['stock.quant'].read_group(
+            [('product_id', 'in', products.ids),
+             ('location_id', 'in', area_context.location_ids)],
+            ['product_id', 'quantity', 'reserved_quantity'],
+            ['product_id'])
+        unreserved = area_context.mrp_area.unreserved_qty
+        for group in groups:
+            qty = group['quantity']
+            if unreserved:
+                qty -= group['reserved_quantity']
+            res[group['product_id'][0]] = qty
+        return res
+
+    @api.model
+    def _prepare_mrp_product_data(self, product, mrp_area,
+                                  area_context=None):
+        if area_context is None:
+            area_context = self._get_mrp_area_context(mrp_area)
+        if product.id not in area_context.qty_available:
+            area_context.qty_available.update(
+                self._get_mrp_qty_available(product, area_context))
         return {
             'mrp_area_id': mrp_area.id,
             'product_id': product.id,
-            'mrp_qty_available': product.qty_available,
+            'mrp_qty_available': area_context.qty_available[product.id],
             'mrp_llc': product.llc,
             'name': '[%s] %s' % (mrp_area.name, product.display_name),
         }
@@ -171,9 +436,16 @@ class MultiLevelMrp(models.TransientModel):
 
     @api.model
     def _prepare_mrp_move_data_bom_explosion(
-            self, product, bomline, qty, mrp_date_demand_2, bom, name):
-        mrp_product = self._get_mrp_product_from_product_and_area(
-            bomline.product_id, product.mrp_area_id)
+            self, product, bomline, qty, mrp_date_demand_2, bom, name,
+            component_mrp_product=None, component_qty=None):
+        """``component_qty`` is the quantity of component per unit of
+        ``product``, the one of ``bomline`` if not given."""
+        if component_qty is None:
+            component_qty = bomline.product_qty
+        mrp_product = component_mrp_product
+        if mrp_product is None:
+            mrp_product = self._get_mrp_product_from_product_and_area(
+                bomline.product_id, product.mrp_area_id)
         if not mrp_product:
             raise exceptions.Warning(
                 _("No MRP product found"))
@@ -186,7 +458,7 @@ class MultiLevelMrp(models.TransientModel):
             'purchase_order_id': None,
             'purchase_line_id': None,
             'stock_move_id': None,
-            'mrp_qty': -(qty * bomline.product_qty),  # TODO: review with UoM
+            'mrp_qty': -(qty * component_qty),  # TODO: review with UoM
             'current_qty': None,
             'mrp_date': mrp_date_demand_2,
             'current_date': None,
@@ -204,128 +476,287 @@ class MultiLevelMrp(models.TransientModel):
         }
 
     @api.model
-    def create_move(self, mrp_product_id, mrp_date, mrp_qty, name):
-        self = self.with_context(auditlog_disabled=True)
-
-        values = {}
-        if not isinstance(mrp_date, date):
-            mrp_date = fields.Date.from_string(mrp_date)
-
-        if mrp_product_id.supply_method == 'buy':
-            # if mrp_product_id.purchase_requisition:
+    def _get_mrp_action(self, mrp_product):
+        if mrp_product.supply_method == 'buy':
+            # if mrp_product.purchase_requisition:
             #     mrp_action = 'pr'
             # else:
-            mrp_action = 'po'
-        else:
-            # TODO: consider 'none'...
-            mrp_action = 'mo'
+            return 'po'
+        # TODO: consider 'none'...
+        return 'mo'
 
-        if mrp_date < date.today():
-            mrp_date_supply = date.today()
+    @api.model
+    def _get_mrp_action_date(self, mrp_product, mrp_date, area_context=None):
+        if area_context is not None:
+            calendar = area_context.calendar
         else:
-            mrp_date_supply = mrp_date
-
-        calendar = mrp_product_id.mrp_area_id.calendar_id
-        if calendar and mrp_product_id.mrp_lead_time:
+            calendar = mrp_product.mrp_area_id.calendar_id
+        if calendar and mrp_product.mrp_lead_time:
             date_str = fields.Date.to_string(mrp_date)
             dt = fields.Datetime.from_string(date_str)
-            res = calendar.plan_days(
-                -1 * mrp_product_id.mrp_lead_time - 1, dt)
-            mrp_action_date = res.date()
-        else:
-            mrp_action_date = mrp_date - timedelta(
-                days=mrp_product_id.mrp_lead_time)
+            res = calendar.plan_days_cached(
+                -1 * mrp_product.mrp_lead_time - 1, dt)
+            return res.date()
+        return mrp_date - timedelta(days=mrp_product.mrp_lead_time)
+
+    @api.model
+    def _get_bom_explosion(self, mrp_product, area_context=None):
+        """Return the list of :class:`BomExplosionLine` to explode the
+        planned manufacturing orders of ``mrp_product`` into.
+
+        The explosion is computed once per product and MRP run and kept in
+        the area context, so that exploding the same parent again is a
+        dictionary lookup. BoMs are not expected to change during a run.
+        """
+        product_id = mrp_product.product_id.id
+        if area_context is not None and \
+                product_id in area_context.bom_explosion:
+            return area_context.bom_explosion[product_id]
+        explosion = []
+        for bom in mrp_product.product_id.bom_ids:
+            if not bom.active or not bom.bom_line_ids:
+                continue
+            # TODO: review: mrp_transit_delay, mrp_inspection_delay
+            offset_days = (mrp_product.mrp_transit_delay +
+                           mrp_product.mrp_inspection_delay)
+            for bomline in bom.bom_line_ids:
+                if bomline.product_qty <= 0.00 or \
+                        bomline.product_id.type != 'product':
+                    continue
+                if self._exclude_from_mrp(
+                        mrp_product.mrp_area_id, bomline.product_id):
+                    # Stop explosion.
+                    continue
+                component = self._get_mrp_product_from_product_and_area(
+                    bomline.product_id, mrp_product.mrp_area_id,
+                    area_context=area_context)
+                if not component:
+                    raise exceptions.Warning(
+                        _("No MRP product found"))
+                explosion.append(BomExplosionLine(
+                    bom, bomline, component.id, bomline.product_qty,
+                    offset_days))
+            break
+        if area_context is not None:
+            area_context.bom_explosion[product_id] = explosion
+        return explosion
+
+    @api.model
+    def _plan_supply(self, mrp_product, mrp_date, mrp_qty, name, buffer,
+                     area_context=None):
+        """Plan the supply of ``mrp_qty`` of ``mrp_product`` required on
+        ``mrp_date``, and the demand of components it explodes to, in the
+        :class:`MrpMoveBuffer` ``buffer``. Nothing is written in the
+        database. Return the quantity ordered."""
+        mrp_action = self._get_mrp_action(mrp_product)
+        today = date.today()
+        # No order can be received inside the frozen time fence. The action
+        # date is still computed from the date required, showing when the
+        # order is late.
+        first_date = today
+        if area_context is not None:
+            first_date = area_context.frozen_end
+        mrp_date_supply = self._get_mrp_bucket_date(
+            max(mrp_date, first_date), area_context)
+        mrp_action_date = self._get_mrp_action_date(
+            mrp_product, mrp_date, area_context=area_context)
+        explosion = []
+        if mrp_action == 'mo':
+            explosion = self._get_bom_explosion(
+                mrp_product, area_context=area_context)
+            mrp_date_demand = max(mrp_action_date, today)
+        mrp_product_obj = self.env['mrp.product']
 
         qty_ordered = 0.00
-        qty_to_order = mrp_qty
-        while qty_ordered < mrp_qty:
-            qty = mrp_product_id._adjust_qty_to_order(qty_to_order)
-            qty_to_order -= qty
-            move_data = self._prepare_mrp_move_data_supply(
-                mrp_product_id, qty, mrp_date_supply, mrp_action_date,
-                mrp_action, name)
-            mrpmove_id = self.env['mrp.move'].create(move_data)
+        for qty in mrp_product._split_qty_to_order(mrp_qty):
+            supply_index = buffer.add_supply(
+                self._prepare_mrp_move_data_supply(
+                    mrp_product, qty, mrp_date_supply, mrp_action_date,
+                    mrp_action, name))
             qty_ordered = qty_ordered + qty
+            for line in explosion:
+                buffer.add_demand(
+                    supply_index,
+                    self._prepare_mrp_move_data_bom_explosion(
+                        mrp_product, line.bomline, qty,
+                        self._get_mrp_bucket_date(
+                            mrp_date_demand - timedelta(
+                                days=line.offset_days),
+                            area_context),
+                        line.bom, name,
+                        component_mrp_product=mrp_product_obj.browse(
+                            line.mrp_product_id),
+                        component_qty=line.qty))
+        return qty_ordered
 
-            if mrp_action == 'mo':
-                mrp_date_demand = mrp_action_date
-                if mrp_date_demand < date.today():
-                    mrp_date_demand = date.today()
-                if not mrp_product_id.product_id.bom_ids:
-                    continue
-                bomcount = 0
-                for bom in mrp_product_id.product_id.bom_ids:
-                    if not bom.active or not bom.bom_line_ids:
-                        continue
-                    bomcount += 1
-                    if bomcount != 1:
-                        continue
-                    for bomline in bom.bom_line_ids:
-                        if bomline.product_qty <= 0.00 or \
-                                bomline.product_id.type != 'product':
-                            continue
-                        if self._exclude_from_mrp(
-                                mrp_product_id.mrp_area_id,
-                                bomline.product_id):
-                            # Stop explosion.
-                            continue
-                        # TODO: review: mrp_transit_delay, mrp_inspection_delay
-                        mrp_date_demand_2 = mrp_date_demand - timedelta(
-                            days=(mrp_product_id.mrp_transit_delay +
-                                  mrp_product_id.mrp_inspection_delay))
-                        move_data = \
-                            self._prepare_mrp_move_data_bom_explosion(
-                                mrp_product_id, bomline, qty,
-                                mrp_date_demand_2,
-                                bom, name)
-                        mrpmove_id2 = self.env['mrp.move'].create(move_data)
-                        mrpmove_id.mrp_move_down_ids = [(4, mrpmove_id2.id)]
+    @api.model
+    def _flush_mrp_move_buffer(self, buffer):
+        """Write the moves planned in ``buffer`` with multi-row statements,
+        and empty it."""
+        moves = self.env['mrp.move']._create_with_pegging(
+            buffer.vals_list, pegging=buffer.pegging)
+        self._get_mrp_run_profiler().add_records_written(
+            len(moves) + len(buffer.pegging))
+        buffer.clear()
+        return moves
+
+    @api.model
+    def create_move(self, mrp_product_id, mrp_date, mrp_qty, name):
+        values = {}
+        if not isinstance(mrp_date, date):
+            mrp_date = fields.Date.from_string(mrp_date)
+        buffer = MrpMoveBuffer()
+        qty_ordered = self._plan_supply(
+            mrp_product_id, mrp_date, mrp_qty, name, buffer)
+        self._flush_mrp_move_buffer(buffer)
         values['qty_ordered'] = qty_ordered
         log_msg = '%s' % qty_ordered
-        logger.info(log_msg)
+        logger.debug(log_msg)
         return values
 
     @api.model
-    def _mrp_cleanup(self):
-        # Some part of the code with the new API is replaced by
-        # sql statements due to performance issues when the auditlog is
-        # installed
+    def _get_mrp_run_profiler(self):
+        """Return the :class:`MrpRunProfiler` of the MRP run in progress,
+        or a new one not recorded anywhere outside of a run."""
+        return self.env.context.get('mrp_run_profiler') or MrpRunProfiler()
+
+    @api.model
+    def _mrp_cleanup(self, mrp_areas=None, keep_generations=None):
+        """Delete the MRP moves, pegging links, inventories and products of
+        ``mrp_areas``, or of all the areas if not given, of every plan
+        generation except the ones of ``keep_generations`` if given.
+
+        The rows are deleted with plain SQL statements: going through
+        ``unlink`` would load every record in the cache, check the access
+        rules and trigger the auditlog and recomputation machinery for
+        data that is entirely generated by the MRP run. TRUNCATE is not
+        used as it locks out the planners reading the previous plan and
+        fails on the tables referencing these ones.
+
+        :return: dictionary with the number of rows deleted per table and
+                 the duration of the cleanup, in seconds.
+        """
         logger.info('START MRP CLEANUP')
-        self.env['mrp.move'].search([]).unlink()
-        self.env['mrp.product'].search([]).unlink()
-        self.env['mrp.inventory'].search([]).unlink()
-        logger.info('END MRP CLEANUP')
-        return True
+        start = time.time()
+        cr = self.env.cr
+        conditions, params = [], []
+        if mrp_areas is not None:
+            conditions.append('mrp_area_id IN %s')
+            params.append(tuple(mrp_areas.ids) or (None,))
+        if keep_generations:
+            conditions.append('generation NOT IN %s')
+            params.append(tuple(keep_generations))
+        where = ''
+        if conditions:
+            where = 'WHERE ' + ' AND '.join(conditions)
+        res = {}
+        cr.execute("""
+            DELETE FROM mrp_move_rel WHERE move_up_id IN (
+                SELECT id FROM mrp_move %s)
+        """ % where, params)
+        res['mrp_move_rel'] = cr.rowcount
+        for table in ('mrp_inventory', 'mrp_move_pegging', 'mrp_move',
+                      'mrp_product'):
+            cr.execute('DELETE FROM %s %s' % (table, where), params)
+            res[table] = cr.rowcount
+        self.env.invalidate_all()
+        res['duration'] = time.time() - start
+        log_msg = 'END MRP CLEANUP - DELETED: %s MOVES, %s PEGGING LINKS, ' \
+                  '%s INVENTORIES, %s PRODUCTS IN %.2fs' % (
+                      res['mrp_move'], res['mrp_move_rel'],
+                      res['mrp_inventory'], res['mrp_product'],
+                      res['duration'])
+        logger.info(log_msg)
+        return res
+
+    @api.model
+    def _get_bom_graph(self):
+        """Return the BoM dependency graph as a dictionary mapping the id of
+        every product having an active BoM to the set of ids of its
+        components."""
+        self.env.cr.execute("""
+            SELECT DISTINCT pp.id, bl.product_id
+            FROM mrp_bom_line bl
+            JOIN mrp_bom b ON b.id = bl.bom_id
+            JOIN product_product pp ON pp.product_tmpl_id = b.product_tmpl_id
+            WHERE b.active AND pp.active
+        """)
+        graph = defaultdict(set)
+        for product_id, component_id in self.env.cr.fetchall():
+            graph[product_id].add(component_id)
+        return graph
+
+    @api.model
+    def _get_bom_cycle_product_ids(self, graph, product_ids):
+        """Among ``product_ids``, that could not be sorted topologically,
+        keep only the products that are part of a cycle, discarding the
+        ones that merely depend on it."""
+        remaining = set(product_ids)
+        changed = True
+        while changed:
+            changed = False
+            for product_id in list(remaining):
+                if not graph.get(product_id, set()) & remaining:
+                    remaining.discard(product_id)
+                    changed = True
+        return remaining
+
+    @api.model
+    def _get_low_level_codes(self, graph):
+        """Compute the low level code of every product in ``graph`` as the
+        length of the longest path from a top level product, in a single
+        topological pass.
+
+        :raise UserError: if the BoMs contain a cycle.
+        """
+        indegree = defaultdict(int)
+        for component_ids in graph.values():
+            for component_id in component_ids:
+                indegree[component_id] += 1
+        llc = dict.fromkeys(set(graph) | set(indegree), 0)
+        queue = deque(pid for pid in llc if not indegree[pid])
+        while queue:
+            product_id = queue.popleft()
+            for component_id in graph.get(product_id, ()):
+                llc[component_id] = max(
+                    llc[component_id], llc[product_id] + 1)
+                indegree[component_id] -= 1
+                if not indegree[component_id]:
+                    queue.append(component_id)
+        unsorted = [pid for pid, degree in indegree.items() if degree]
+        if unsorted:
+            cycle_ids = self._get_bom_cycle_product_ids(graph, unsorted)
+            products = self.env['product.product'].browse(
+                sorted(cycle_ids)).with_context(active_test=False)
+            raise UserError(_(
+                "The Bills of Materials of the following products are "
+                "recursive, the low level codes cannot be computed:\n%s") %
+                '\n'.join(products.mapped('display_name')))
+        return llc
 
     @api.model
     def _low_level_code_calculation(self):
         logger.info('START LOW LEVEL CODE CALCULATION')
-        counter = 999999
-        llc = 0
-        self.env['product.product'].search([]).write({'llc': llc})
-        products = self.env['product.product'].search([('llc', '=', llc)])
-        if products:
-            counter = len(products)
-        log_msg = 'LOW LEVEL CODE 0 FINISHED - NBR PRODUCTS: %s' % counter
-        logger.info(log_msg)
+        llc_by_product = self._get_low_level_codes(self._get_bom_graph())
+        self.env.cr.execute("SELECT id, llc FROM product_product")
+        products_by_llc = defaultdict(list)
+        counter_by_llc = defaultdict(int)
+        for product_id, current_llc in self.env.cr.fetchall():
+            llc = llc_by_product.get(product_id, 0)
+            counter_by_llc[llc] += 1
+            if llc != current_llc:
+                products_by_llc[llc].append(product_id)
+        # Only the products whose level has changed are written, in one
+        # batch per level.
+        product_obj = self.env['product.product']
+        for llc, product_ids in products_by_llc.items():
+            product_obj.browse(product_ids).write({'llc': llc})
 
-        while counter:
-            llc += 1
-            products = self.env['product.product'].search(
-                [('llc', '=', llc - 1)])
-            p_templates = products.mapped('product_tmpl_id')
-            bom_lines = self.env['mrp.bom.line'].search(
-                [('product_id.llc', '=', llc - 1),
-                 ('bom_id.product_tmpl_id', 'in', p_templates.ids)])
-            products = bom_lines.mapped('product_id')
-            products.write({'llc': llc})
-            products = self.env['product.product'].search([('llc', '=', llc)])
-            counter = len(products)
+        mrp_lowest_llc = max(counter_by_llc or [0]) + 1
+        for llc in range(mrp_lowest_llc):
             log_msg = 'LOW LEVEL CODE %s FINISHED - NBR PRODUCTS: %s' % (
-                llc, counter)
+                llc, counter_by_llc[llc])
             logger.info(log_msg)
-
-        mrp_lowest_llc = llc
         logger.info('END LOW LEVEL CODE CALCULATION')
         return mrp_lowest_llc
 
@@ -336,12 +767,29 @@ class MultiLevelMrp(models.TransientModel):
         """
         return True
 
+    @api.model
+    def _filter_mrp_applicable(self, products):
+        """Return the products applicable to the MRP among the stockable
+        ``products``. Meant to be overridden instead of
+        :meth:`_adjust_mrp_applicable`, as the products are then only
+        written when their value changes."""
+        return products
+
     @api.model
     def _calculate_mrp_applicable(self):
         logger.info('CALCULATE MRP APPLICABLE')
-        self.env['product.product'].search([]).write({'mrp_applicable': False})
-        self.env['product.product'].search([
-            ('type', '=', 'product'),
+        product_obj = self.env['product.product']
+        applicable = self._filter_mrp_applicable(
+            product_obj.search([('type', '=', 'product')]))
+        # Only write the products whose value changes, so that their last
+        # modification date keeps being meaningful for net change runs.
+        product_obj.search([
+            ('mrp_applicable', '=', True),
+            ('id', 'not in', applicable.ids),
+        ]).write({'mrp_applicable': False})
+        product_obj.search([
+            ('mrp_applicable', '=', False),
+            ('id', 'in', applicable.ids),
         ]).write({'mrp_applicable': True})
         self._adjust_mrp_applicable()
         counter = self.env['product.product'].search([
@@ -351,82 +799,170 @@ class MultiLevelMrp(models.TransientModel):
         return True
 
     @api.model
-    def _init_mrp_product(self, product, mrp_area):
+    def _bulk_create(self, model_name, vals_list):
+        """Create ``vals_list`` in ``model_name``, a model of the MRP plan,
+        with multi-row INSERT statements (see ``mrp.plan.mixin``), counting
+        them in the profile of the MRP run."""
+        records = self.env[model_name]._bulk_create(vals_list)
+        self._get_mrp_run_profiler().add_records_written(len(records))
+        return records
 
-        mrp_product_data = self._prepare_mrp_product_data(
-            product, mrp_area)
-        return self.env['mrp.product'].create(mrp_product_data)
+    @api.model
+    def _init_mrp_product(self, product, mrp_area, area_context=None):
+        """Create the MRP products of ``product`` (one or several product
+        variants) in ``mrp_area``."""
+        if area_context is None:
+            area_context = self._get_mrp_area_context(mrp_area)
+        area_context.qty_available.update(
+            self._get_mrp_qty_available(product, area_context))
+        vals_list = [
+            self._prepare_mrp_product_data(
+                p, mrp_area, area_context=area_context)
+            for p in product]
+        return self._bulk_create('mrp.product', vals_list)
 
     @api.model
-    def _init_mrp_move_from_forecast(self, mrp_product):
-        locations = self.env['stock.location'].search(
-            [('id', 'child_of', mrp_product.mrp_area_id.location_id.id)])
+    def _get_mrp_product_by_product(self, mrp_product):
+        """Map the product ids of ``mrp_product`` to their MRP product.
+        All the MRP products must belong to the same MRP area."""
+        mrp_product.mapped('mrp_area_id').ensure_one()
+        return {rec.product_id.id: rec for rec in mrp_product}
+
+    @api.model
+    def _init_mrp_move_from_forecast(self, mrp_product, area_context=None):
+        """Create the forecast demand of ``mrp_product``, that can hold
+        several MRP products of a same MRP area."""
+        if not mrp_product:
+            return True
+        mrp_product_by_product = self._get_mrp_product_by_product(
+            mrp_product)
+        if area_context is None:
+            area_context = self._get_mrp_area_context(
+                mrp_product[:1].mrp_area_id)
         today = fields.Date.today()
-        estimates = self.env['stock.demand.estimate'].search([
-            ('product_id', '=', mrp_product.product_id.id),
-            ('location_id', 'in', locations.ids),
+        domain = [
+            ('product_id', 'in', list(mrp_product_by_product.keys())),
+            ('location_id', 'in', area_context.location_ids),
             ('date_range_id.date_end', '>=', today)
-        ])
+        ]
+        if area_context.skip_beyond_horizon:
+            domain.append(('date_range_id.date_start', '<=',
+                           fields.Date.to_string(area_context.horizon_end)))
+        estimates = self.env['stock.demand.estimate'].search(domain)
+        vals_list = []
         for rec in estimates:
             start = rec.date_range_id.date_start
             if start < today:
                 start = today
             mrp_date = fields.Date.from_string(start)
             date_end = fields.Date.from_string(rec.date_range_id.date_end)
+            if area_context.skip_beyond_horizon:
+                date_end = min(date_end, area_context.horizon_end)
             delta = timedelta(days=1)
+            # Days beyond the bucket horizon are summed in a single move
+            # per bucket. With an aggregated forecast, the days before are
+            # summed in a single move spread over them.
+            vals_by_bucket = {}
             while mrp_date <= date_end:
-                mrp_move_data = \
-                    self._prepare_mrp_move_data_from_forecast(
-                        rec, mrp_product, mrp_date)
-                self.env['mrp.move'].create(mrp_move_data)
-                mrp_date += delta
+                bucket_date = self._get_mrp_bucket_date(
+                    mrp_date, area_context)
+                key = bucket_date
+                if area_context.mrp_area.aggregate_forecast and (
+                        area_context.bucket_start is None or
+                        mrp_date < area_context.bucket_start) and (
+                        area_context.horizon_end is None or
+                        mrp_date <= area_context.horizon_end):
+                    key = 'period'
+                vals = self._prepare_mrp_move_data_from_forecast(
+                    rec, mrp_product_by_product[rec.product_id.id],
+                    bucket_date)
+                nbr_days = 1
+                if area_context.horizon_end is not None and \
+                        mrp_date > area_context.horizon_end:
+                    # All the remaining days at once on the horizon.
+                    nbr_days = (date_end - mrp_date).days + 1
+                    vals['mrp_qty'] *= nbr_days
+                    vals['current_qty'] *= nbr_days
+                if key in vals_by_bucket:
+                    bucket_vals = vals_by_bucket[key]
+                    bucket_vals['mrp_qty'] += vals['mrp_qty']
+                    bucket_vals['current_qty'] += vals['current_qty']
+                    if key == 'period':
+                        bucket_vals['mrp_date_end'] = mrp_date
+                else:
+                    if key == 'period':
+                        vals['mrp_date_end'] = mrp_date
+                    vals_by_bucket[key] = vals
+                    vals_list.append(vals)
+                mrp_date += delta * nbr_days
+        self._bulk_create('mrp.move', vals_list)
         return True
 
+    @api.model
+    def _horizon_domain(self, date_field, area_context):
+        """Return the domain excluding the records whose ``date_field`` is
+        beyond the planning horizon, when the area skips them."""
+        if not area_context.skip_beyond_horizon:
+            return []
+        return [(date_field, '<', fields.Date.to_string(
+            area_context.horizon_end + timedelta(days=1)))]
+
     # TODO: move this methods to mrp_product?? to be able to
     # show moves with an action
     @api.model
-    def _in_stock_moves_domain(self, mrp_product):
-        locations = self.env['stock.location'].search(
-            [('id', 'child_of', mrp_product.mrp_area_id.location_id.id)])
+    def _in_stock_moves_domain(self, mrp_product, area_context=None):
+        if area_context is None:
+            area_context = self._get_mrp_area_context(
+                mrp_product[:1].mrp_area_id)
         return [
-            ('product_id', '=', mrp_product.product_id.id),
+            ('product_id', 'in', mrp_product.mapped('product_id').ids),
             ('state', 'not in', ['done', 'cancel']),
             ('product_qty', '>', 0.00),
-            ('location_id', 'not in', locations.ids),
-            ('location_dest_id', 'in', locations.ids),
-        ]
+            ('location_id', 'not in', area_context.location_ids),
+            ('location_dest_id', 'in', area_context.location_ids),
+        ] + self._horizon_domain('date_expected', area_context)
 
     @api.model
-    def _out_stock_moves_domain(self, mrp_product):
-        locations = self.env['stock.location'].search(
-            [('id', 'child_of', mrp_product.mrp_area_id.location_id.id)])
+    def _out_stock_moves_domain(self, mrp_product, area_context=None):
+        if area_context is None:
+            area_context = self._get_mrp_area_context(
+                mrp_product[:1].mrp_area_id)
         return [
-            ('product_id', '=', mrp_product.product_id.id),
+            ('product_id', 'in', mrp_product.mapped('product_id').ids),
             ('state', 'not in', ['done', 'cancel']),
             ('product_qty', '>', 0.00),
-            ('location_id', 'in', locations.ids),
-            ('location_dest_id', 'not in', locations.ids),
-        ]
+            ('location_id', 'in', area_context.location_ids),
+            ('location_dest_id', 'not in', area_context.location_ids),
+        ] + self._horizon_domain('date_expected', area_context)
 
     @api.model
-    def _init_mrp_move_from_stock_move(self, mrp_product):
+    def _init_mrp_move_from_stock_move(self, mrp_product, area_context=None):
         # TODO: Should we exclude the quantity done from the moves?
+        if not mrp_product:
+            return True
+        mrp_product_by_product = self._get_mrp_product_by_product(
+            mrp_product)
         move_obj = self.env['stock.move']
-        mrp_move_obj = self.env['mrp.move']
-        in_domain = self._in_stock_moves_domain(mrp_product)
+        in_domain = self._in_stock_moves_domain(
+            mrp_product, area_context=area_context)
         in_moves = move_obj.search(in_domain)
-        out_domain = self._out_stock_moves_domain(mrp_product)
+        out_domain = self._out_stock_moves_domain(
+            mrp_product, area_context=area_context)
         out_moves = move_obj.search(out_domain)
-        if in_moves:
-            for move in in_moves:
-                move_data = self._prepare_mrp_move_data_from_stock_move(
-                    mrp_product, move, direction='in')
-                mrp_move_obj.create(move_data)
-        if out_moves:
-            for move in out_moves:
-                move_data = self._prepare_mrp_move_data_from_stock_move(
-                    mrp_product, move, direction='out')
-                mrp_move_obj.create(move_data)
+        vals_list = []
+        for move in in_moves:
+            vals_list.append(self._prepare_mrp_move_data_from_stock_move(
+                mrp_product_by_product[move.product_id.id], move,
+                direction='in'))
+        for move in out_moves:
+            vals_list.append(self._prepare_mrp_move_data_from_stock_move(
+                mrp_product_by_product[move.product_id.id], move,
+                direction='out'))
+        if area_context is None:
+            area_context = self._get_mrp_area_context(
+                mrp_product[:1].mrp_area_id)
+        self._set_mrp_bucket_dates(vals_list, area_context=area_context)
+        self._bulk_create('mrp.move', vals_list)
         return True
 
     @api.model
@@ -435,6 +971,7 @@ class MultiLevelMrp(models.TransientModel):
         if fields.Date.from_string(poline.date_planned) > date.today():
             mrp_date = fields.Date.from_string(poline.date_planned)
         return {
+            'mrp_area_id': mrp_product.mrp_area_id.id,
             'product_id': poline.product_id.id,
             'mrp_product_id': mrp_product.id,
             'production_id': None,
@@ -457,39 +994,74 @@ class MultiLevelMrp(models.TransientModel):
         }
 
     @api.model
-    def _init_mrp_move_from_purchase_order(self, mrp_product):
-        location_ids = self.env['stock.location'].search(
-            [('id', 'child_of', mrp_product.mrp_area_id.location_id.id)])
-        picking_types = self.env['stock.picking.type'].search(
-            [('default_location_dest_id', 'in',
-              location_ids.ids)])
-        picking_type_ids = [ptype.id for ptype in picking_types]
-        orders = self.env['purchase.order'].search(
-            [('picking_type_id', 'in', picking_type_ids),
-             ('state', 'in', ['draft', 'sent', 'to approve'])])
-        po_lines = self.env['purchase.order.line'].search(
-            [('order_id', 'in', orders.ids),
-             ('product_qty', '>', 0.0),
-             ('product_id', '=', mrp_product.product_id.id)])
-
+    def _init_mrp_move_from_purchase_order(self, mrp_product,
+                                           area_context=None):
+        if not mrp_product:
+            return True
+        mrp_product_by_product = self._get_mrp_product_by_product(
+            mrp_product)
+        if area_context is None:
+            area_context = self._get_mrp_area_context(
+                mrp_product[:1].mrp_area_id)
+        domain = [
+            ('order_id.picking_type_id', 'in', area_context.picking_type_ids),
+            ('order_id.state', 'in', ['draft', 'sent', 'to approve']),
+            ('product_qty', '>', 0.0),
+            ('product_id', 'in', list(mrp_product_by_product.keys())),
+        ] + self._horizon_domain('date_planned', area_context)
+        po_lines = self.env['purchase.order.line'].search(domain)
+        vals_list = []
         for line in po_lines:
-            mrp_move_data = \
+            vals_list.append(
                 self._prepare_mrp_move_data_from_purchase_order(
-                    line, mrp_product)
-            self.env['mrp.move'].create(mrp_move_data)
+                    line, mrp_product_by_product[line.product_id.id]))
+        self._set_mrp_bucket_dates(vals_list, area_context=area_context)
+        self._bulk_create('mrp.move', vals_list)
+        return True
 
     @api.model
-    def _get_mrp_product_from_product_and_area(self, product, mrp_area):
+    def _get_mrp_product_index(self, mrp_area):
+        """Map the product ids of the MRP products of ``mrp_area`` to the
+        MRP product ids."""
+        # Descending order so that the first MRP product wins, as with the
+        # search it replaces.
+        self.env.cr.execute("""
+            SELECT product_id, id FROM mrp_product
+            WHERE mrp_area_id = %s AND generation = %s ORDER BY id DESC
+        """, (mrp_area.id, self.env['mrp.product']._get_mrp_generation()))
+        return dict(self.env.cr.fetchall())
+
+    @api.model
+    def _get_mrp_product_from_product_and_area(self, product, mrp_area,
+                                               area_context=None):
+        if area_context is not None and \
+                area_context.mrp_area == mrp_area:
+            if area_context.mrp_product_index is None:
+                area_context.mrp_product_index = \
+                    self._get_mrp_product_index(mrp_area)
+            return self.env['mrp.product'].browse(
+                area_context.mrp_product_index.get(product.id))
         return self.env['mrp.product'].search([
             ('product_id', '=', product.id),
             ('mrp_area_id', '=', mrp_area.id),
         ], limit=1)
 
     @api.model
-    def _init_mrp_move(self, mrp_product):
-        self._init_mrp_move_from_forecast(mrp_product)
-        self._init_mrp_move_from_stock_move(mrp_product)
-        self._init_mrp_move_from_purchase_order(mrp_product)
+    def _init_mrp_move(self, mrp_product, area_context=None):
+        """Load the existing demand and supply of ``mrp_product``, that can
+        hold several MRP products of a same MRP area. Each source is read
+        with a single query for all of them."""
+        if not mrp_product:
+            return
+        if area_context is None:
+            area_context = self._get_mrp_area_context(
+                mrp_product[:1].mrp_area_id)
+        self._init_mrp_move_from_forecast(
+            mrp_product, area_context=area_context)
+        self._init_mrp_move_from_stock_move(
+            mrp_product, area_context=area_context)
+        self._init_mrp_move_from_purchase_order(
+            mrp_product, area_context=area_context)
 
     @api.model
     def _exclude_from_mrp(self, mrp_area, product):
@@ -497,277 +1069,1169 @@ class MultiLevelMrp(models.TransientModel):
         return product.mrp_exclude
 
     @api.model
-    def _mrp_initialisation(self):
+    def _get_mrp_applicable_products(self, products=None):
+        domain = [('mrp_applicable', '=', True)]
+        if products is not None:
+            domain.append(('id', 'in', products.ids))
+        return self.env['product.product'].search(domain)
+
+    @api.model
+    def _mrp_initialisation(self, mrp_areas=None, products=None):
+        """Initialise the MRP products and moves of the MRP applicable
+        products in ``mrp_areas`` (all the areas by default), restricted to
+        ``products`` if given."""
         logger.info('START MRP INITIALISATION')
-        mrp_areas = self.env['mrp.area'].search([])
-        products = self.env['product.product'].search([
-            ('mrp_applicable', '=', True)])
+        if mrp_areas is None:
+            mrp_areas = self.env['mrp.area'].search([])
+        products = self._get_mrp_applicable_products(products)
         init_counter = 0
         for mrp_area in mrp_areas:
-            for product in products:
-                if self._exclude_from_mrp(mrp_area, product):
-                    continue
-                init_counter += 1
-                log_msg = 'MRP INIT: %s - %s ' % (
-                    init_counter, product.default_code)
-                logger.info(log_msg)
-                mrp_product = self._init_mrp_product(product, mrp_area)
-                self._init_mrp_move(mrp_product)
-        logger.info('END MRP INITIALISATION')
-
-    @api.model
-    def _init_mrp_move_grouped_demand(self, nbr_create, mrp_product):
-        last_date = None
-        last_qty = 0.00
-        onhand = mrp_product.mrp_qty_available
-        move_ids = []
-        for move in mrp_product.mrp_move_ids:
-            move_ids.append(move.id)
-        for move_id in move_ids:
-            move_rec = self.env['mrp.move'].search(
-                [('id', '=', move_id)])
-            for move in move_rec:
-                if move.mrp_action == 'none':
-                    if last_date is not None:
-                        if datetime.date(
-                                datetime.strptime(
-                                    move.mrp_date, '%Y-%m-%d')) \
-                                > last_date+timedelta(
-                                    days=mrp_product.mrp_nbr_days):
-                            if (onhand + last_qty + move.mrp_qty) \
-                                    < mrp_product.mrp_minimum_stock \
-                                    or (onhand + last_qty) \
-                                    < mrp_product.mrp_minimum_stock:
-                                name = 'Grouped Demand for %d Days' % \
-                                    mrp_product.mrp_nbr_days
-                                qtytoorder = \
-                                    mrp_product.mrp_minimum_stock - \
-                                    mrp_product - last_qty
-                                cm = self.create_move(
-                                    mrp_product_id=mrp_product.id,
-                                    mrp_date=last_date,
-                                    mrp_qty=qtytoorder,
-                                    name=name)
-                                qty_ordered = cm['qty_ordered']
-                                onhand = onhand + last_qty + qty_ordered
-                                last_date = None
-                                last_qty = 0.00
-                                nbr_create += 1
-                    if (onhand + last_qty + move.mrp_qty) < \
-                            mrp_product.mrp_minimum_stock or \
-                            (onhand + last_qty) < \
-                            mrp_product.mrp_minimum_stock:
-                        if last_date is None:
-                            last_date = datetime.date(
-                                datetime.strptime(move.mrp_date,
-                                                  '%Y-%m-%d'))
-                            last_qty = move.mrp_qty
-                        else:
-                            last_qty = last_qty + move.mrp_qty
-                    else:
-                        last_date = datetime.date(
-                            datetime.strptime(move.mrp_date,
-                                              '%Y-%m-%d'))
-                        onhand = onhand + move.mrp_qty
-
-        if last_date is not None and last_qty != 0.00:
-            name = 'Grouped Demand for %d Days' % \
-                   (mrp_product.mrp_nbr_days, )
-            qtytoorder = mrp_product.mrp_minimum_stock - onhand - last_qty
-            cm = self.create_move(
-                mrp_product_id=mrp_product.id, mrp_date=last_date,
-                mrp_qty=qtytoorder, name=name)
-            qty_ordered = cm['qty_ordered']
-            onhand += qty_ordered
-            nbr_create += 1
-        return nbr_create
-
-    @api.model
-    def _mrp_calculation(self, mrp_lowest_llc):
+            mrp_products = self._init_mrp_area(mrp_area, products)
+            init_counter += len(mrp_products)
+        log_msg = 'END MRP INITIALISATION - NBR PRODUCTS: %s' % init_counter
+        logger.info(log_msg)
+
+    @api.model
+    def _init_mrp_area(self, mrp_area, products, area_context=None):
+        """Initialise the MRP products and moves of ``products``, that have
+        to be MRP applicable, in ``mrp_area``."""
+        if area_context is None:
+            area_context = self._get_mrp_area_context(mrp_area)
+        area_products = products.filtered(
+            lambda p: not self._exclude_from_mrp(mrp_area, p))
+        mrp_products = self._init_mrp_product(
+            area_products, mrp_area, area_context=area_context)
+        self._init_mrp_move(mrp_products, area_context=area_context)
+        area_context.mrp_product_index = self._get_mrp_product_index(mrp_area)
+        log_msg = 'MRP INIT: %s - %s PRODUCTS' % (
+            mrp_area.name, len(mrp_products))
+        logger.info(log_msg)
+        return mrp_products
+
+    @api.model
+    def _get_lot_sizing(self, mrp_product):
+        """Return the lot sizing policy of ``mrp_product``."""
+        if mrp_product.mrp_lot_sizing:
+            return mrp_product.mrp_lot_sizing
+        if mrp_product.mrp_nbr_days:
+            return 'poq'
+        return mrp_product.mrp_area_id.lot_sizing or 'lfl'
+
+    @api.model
+    def _plan_lot_sizing(self, mrp_product, moves, onhand, buffer,
+                         area_context=None):
+        """Net the sorted ``moves`` of ``mrp_product`` and plan the orders
+        with its lot sizing policy, in ``buffer``. Return the projected on
+        hand and the number of orders planned.
+
+        Every policy is implemented by a ``_plan_lot_sizing_<policy>``
+        method with this signature. The moves inside the slushy time fence
+        of the area are planned lot for lot.
+        """
+        policy = self._get_lot_sizing(mrp_product)
+        method = getattr(self, '_plan_lot_sizing_%s' % policy)
+        nbr_create = 0
+        if area_context is not None and policy != 'lfl':
+            slushy = [move for move in moves
+                      if move[0] < area_context.slushy_end]
+            if slushy:
+                onhand, nbr_create = self._plan_lot_for_lot(
+                    mrp_product, slushy, onhand, buffer,
+                    area_context=area_context)
+                moves = moves[len(slushy):]
+        onhand, nbr_policy = method(
+            mrp_product, moves, onhand, buffer, area_context=area_context)
+        return onhand, nbr_create + nbr_policy
+
+    @api.model
+    def _plan_lot_sizing_lfl(self, mrp_product, moves, onhand, buffer,
+                             area_context=None):
+        return self._plan_lot_for_lot(
+            mrp_product, moves, onhand, buffer, area_context=area_context)
+
+    @api.model
+    def _plan_lot_sizing_foq(self, mrp_product, moves, onhand, buffer,
+                             area_context=None):
+        return self._plan_fixed_order_qty(
+            mrp_product, moves, onhand, buffer,
+            mrp_product.mrp_fixed_order_qty, area_context=area_context)
+
+    @api.model
+    def _plan_lot_sizing_eoq(self, mrp_product, moves, onhand, buffer,
+                             area_context=None):
+        return self._plan_fixed_order_qty(
+            mrp_product, moves, onhand, buffer,
+            self._get_economic_order_qty(mrp_product, moves),
+            area_context=area_context)
+
+    @api.model
+    def _plan_lot_sizing_poq(self, mrp_product, moves, onhand, buffer,
+                             area_context=None):
+        return self._plan_grouped_demand(
+            mrp_product, moves, onhand, buffer, area_context=area_context)
+
+    @api.model
+    def _plan_lot_sizing_ww(self, mrp_product, moves, onhand, buffer,
+                            area_context=None):
+        order_dates = self._get_wagner_whitin_order_dates(
+            mrp_product, moves, onhand)
+
+        def period_end(mrp_date):
+            index = bisect_right(order_dates, mrp_date)
+            if index < len(order_dates):
+                return order_dates[index]
+            return date.max
+        return self._plan_grouped_demand(
+            mrp_product, moves, onhand, buffer, area_context=area_context,
+            period_end=period_end, name='Wagner-Whitin')
+
+    @api.model
+    def _plan_lot_for_lot(self, mrp_product, moves, onhand, buffer,
+                          area_context=None):
+        """Net the sorted ``moves`` of ``mrp_product``, planning for each
+        of them that takes the projected on hand below the minimum stock the
+        quantity needed to get back to it. Return the projected on hand and
+        the number of orders planned."""
+        minimum_stock = mrp_product.mrp_minimum_stock
+        nbr_create = 0
+        for mrp_date, mrp_qty, name in moves:
+            if (onhand + mrp_qty) < minimum_stock:
+                qtytoorder = minimum_stock - onhand - mrp_qty
+                qty_ordered = self._plan_supply(
+                    mrp_product, mrp_date, qtytoorder, name, buffer,
+                    area_context=area_context)
+                onhand += mrp_qty + qty_ordered
+                nbr_create += 1
+            else:
+                onhand += mrp_qty
+        return onhand, nbr_create
+
+    @api.model
+    def _plan_fixed_order_qty(self, mrp_product, moves, onhand, buffer,
+                              order_qty, area_context=None):
+        """Same as :meth:`_plan_lot_for_lot`, ordering the smallest multiple
+        of ``order_qty`` that covers each shortage. Falls back to lot for
+        lot without a quantity."""
+        if order_qty <= 0.0:
+            return self._plan_lot_for_lot(
+                mrp_product, moves, onhand, buffer, area_context=area_context)
+        minimum_stock = mrp_product.mrp_minimum_stock
+        nbr_create = 0
+        for mrp_date, mrp_qty, name in moves:
+            if (onhand + mrp_qty) < minimum_stock:
+                shortage = minimum_stock - onhand - mrp_qty
+                qtytoorder = ceil(shortage / order_qty) * order_qty
+                qty_ordered = self._plan_supply(
+                    mrp_product, mrp_date, qtytoorder, name, buffer,
+                    area_context=area_context)
+                onhand += mrp_qty + qty_ordered
+                nbr_create += 1
+            else:
+                onhand += mrp_qty
+        return onhand, nbr_create
+
+    @api.model
+    def _get_economic_order_qty(self, mrp_product, moves):
+        """Return the economic order quantity of ``mrp_product``, with the
+        average daily demand of ``moves``, or 0.0 if it can not be
+        computed."""
+        ordering_cost = mrp_product.mrp_ordering_cost
+        holding_cost = mrp_product.mrp_holding_cost
+        demand = -sum(qty for __, qty, __ in moves if qty < 0.0)
+        if not moves or ordering_cost <= 0.0 or holding_cost <= 0.0 or \
+                demand <= 0.0:
+            return 0.0
+        nbr_days = (moves[-1][0] - moves[0][0]).days + 1
+        return sqrt(2.0 * demand / nbr_days * ordering_cost / holding_cost)
+
+    @api.model
+    def _get_net_requirements(self, mrp_product, moves, onhand):
+        """Return the sorted list of (date, quantity) of the net
+        requirements of ``mrp_product``, by day, that lot for lot would
+        order before any order quantity adjustment."""
+        minimum_stock = mrp_product.mrp_minimum_stock
+        requirements = []
+        for mrp_date, day_moves in groupby(moves, key=itemgetter(0)):
+            onhand += sum(qty for __, qty, __ in day_moves)
+            if onhand < minimum_stock:
+                requirements.append((mrp_date, minimum_stock - onhand))
+                onhand = minimum_stock
+        return requirements
+
+    @api.model
+    def _get_wagner_whitin_order_dates(self, mrp_product, moves, onhand):
+        """Return the sorted order dates minimising the ordering and holding
+        costs of the net requirements of ``mrp_product`` (Wagner-Whitin).
+
+        ``cost[j]`` is the cost of covering the first ``j`` requirements.
+        Covering requirement ``j`` from an order placed for an earlier
+        requirement ``i`` is never better than ordering again once holding
+        it alone from ``i`` costs more than an order, which bounds the
+        search.
+        """
+        requirements = self._get_net_requirements(
+            mrp_product, moves, onhand)
+        ordering_cost = mrp_product.mrp_ordering_cost
+        holding_cost = mrp_product.mrp_holding_cost
+        nbr = len(requirements)
+        cost = [0.0] * (nbr + 1)
+        order_from = [0] * (nbr + 1)
+        for j in range(1, nbr + 1):
+            date_j, qty_j = requirements[j - 1]
+            best_cost, best_i = None, j
+            holding = 0.0
+            carried = 0.0
+            for i in range(j, 0, -1):
+                date_i = requirements[i - 1][0]
+                if i < j:
+                    # Holding everything from i + 1 to j one more period.
+                    days = (requirements[i][0] - date_i).days
+                    holding += days * carried * holding_cost
+                    if holding_cost * qty_j * (date_j - date_i).days > \
+                            ordering_cost:
+                        break
+                carried += requirements[i - 1][1]
+                total = cost[i - 1] + ordering_cost + holding
+                if best_cost is None or total < best_cost:
+                    best_cost, best_i = total, i
+            cost[j] = best_cost
+            order_from[j] = best_i
+        order_dates = []
+        j = nbr
+        while j > 0:
+            i = order_from[j]
+            order_dates.append(requirements[i - 1][0])
+            j = i - 1
+        order_dates.reverse()
+        return order_dates
+
+    @api.model
+    def _get_mrp_period_end(self, mrp_product, mrp_date):
+        """Return the first date after the grouping period of
+        ``mrp_product`` that holds ``mrp_date``. Periods of days start on
+        ``mrp_date``, weeks and months are calendar aligned."""
+        nbr = mrp_product.mrp_nbr_days
+        period = mrp_product.mrp_grouping_period
+        if period == 'week':
+            week_start = mrp_date - timedelta(days=mrp_date.weekday())
+            return week_start + timedelta(weeks=nbr)
+        if period == 'month':
+            return mrp_date.replace(day=1) + relativedelta(months=nbr)
+        return mrp_date + timedelta(days=nbr)
+
+    @api.model
+    def _plan_grouped_demand(self, mrp_product, moves, onhand, buffer,
+                             area_context=None, period_end=None, name=None):
+        """Net the sorted ``moves`` of ``mrp_product`` with a period order
+        quantity: the first move that takes the projected on hand below the
+        minimum stock opens a period, and a single order planned on its
+        first day covers the net requirements of the whole period. Return
+        the projected on hand and the number of orders planned.
+
+        ``period_end`` maps the opening date of a period to the first date
+        after it, by default the grouping period of the product.
+        """
+        minimum_stock = mrp_product.mrp_minimum_stock
+        if period_end is None:
+            period_end = partial(self._get_mrp_period_end, mrp_product)
+        if name is None:
+            name = 'Grouped Demand for %d %s' % (
+                mrp_product.mrp_nbr_days,
+                GROUPING_PERIOD_LABELS[
+                    mrp_product.mrp_grouping_period or 'day'])
+        nbr_create = 0
+        period_start = period_stop = None
+        period_qty = 0.0
+        for mrp_date, mrp_qty, __ in moves:
+            if period_start is not None and mrp_date >= period_stop:
+                onhand, planned = self._plan_grouped_period(
+                    mrp_product, period_start, period_qty, onhand, name,
+                    buffer, area_context=area_context)
+                nbr_create += planned
+                period_start = None
+                period_qty = 0.0
+            if period_start is None and \
+                    (onhand + mrp_qty) >= minimum_stock:
+                onhand += mrp_qty
+                continue
+            if period_start is None:
+                period_start = mrp_date
+                period_stop = period_end(mrp_date)
+            period_qty += mrp_qty
+        if period_start is not None:
+            onhand, planned = self._plan_grouped_period(
+                mrp_product, period_start, period_qty, onhand, name, buffer,
+                area_context=area_context)
+            nbr_create += planned
+        return onhand, nbr_create
+
+    @api.model
+    def _plan_grouped_period(self, mrp_product, period_start, period_qty,
+                             onhand, name, buffer, area_context=None):
+        qtytoorder = mrp_product.mrp_minimum_stock - onhand - period_qty
+        onhand += period_qty
+        if qtytoorder <= 0.0:
+            # Supply received within the period covers its demand.
+            return onhand, 0
+        onhand += self._plan_supply(
+            mrp_product, period_start, qtytoorder, name, buffer,
+            area_context=area_context)
+        return onhand, 1
+
+    @api.model
+    def _get_mrp_moves_to_net(self, mrp_products):
+        """Return a dictionary mapping the ids of ``mrp_products`` to the
+        sorted list of (date, quantity, name) of their demand and supply
+        without action. Moves spread over a period until their MRP end date
+        are split evenly over its days."""
+        res = defaultdict(list)
+        if not mrp_products:
+            return res
+        self.env.cr.execute("""
+            SELECT m.mrp_product_id, day::date,
+                m.mrp_qty / (COALESCE(m.mrp_date_end, m.mrp_date) -
+                             m.mrp_date + 1),
+                m.name
+            FROM mrp_move m,
+                generate_series(m.mrp_date,
+                                COALESCE(m.mrp_date_end, m.mrp_date),
+                                interval '1 day') AS day
+            WHERE m.mrp_product_id IN %s AND m.mrp_action = 'none'
+            ORDER BY m.mrp_product_id, day, m.mrp_type DESC, m.id
+        """, (tuple(mrp_products.ids),))
+        for mrp_product_id, mrp_date, mrp_qty, name in \
+                self.env.cr.fetchall():
+            res[mrp_product_id].append((mrp_date, mrp_qty, name))
+        return res
+
+    @api.model
+    def _mrp_calculation(self, mrp_lowest_llc, mrp_areas=None,
+                         products=None):
         logger.info('START MRP CALCULATION')
+        counter = 0
+        if mrp_areas is None:
+            mrp_areas = self.env['mrp.area'].search([])
+        for mrp_area in mrp_areas:
+            counter += self._mrp_calculation_area(
+                mrp_area, mrp_lowest_llc, products=products)
+        logger.info('END MRP CALCULATION')
+        return counter
+
+    @api.model
+    def _mrp_calculation_area(self, mrp_area, mrp_lowest_llc, products=None,
+                              area_context=None):
+        """Plan the MRP products of ``mrp_area``, restricted to the ones of
+        ``products`` if given, level by level. Return the number of MRP
+        products planned."""
+        if area_context is None:
+            area_context = self._get_mrp_area_context(mrp_area)
         mrp_product_obj = self.env['mrp.product']
+        profiler = self._get_mrp_run_profiler()
         counter = 0
-        for mrp_area in self.env['mrp.area'].search([]):
-            llc = 0
-            while mrp_lowest_llc > llc:
+        llc = 0
+        while mrp_lowest_llc > llc:
+            with profiler.phase(self.env.cr, 'calculation',
+                                mrp_area=mrp_area, llc=llc):
                 mrp_products = mrp_product_obj.search(
-                    [('mrp_llc', '=', llc),
-                     ('mrp_area_id', '=', mrp_area.id)])
-                llc += 1
-
-                for mrp_product in mrp_products:
-                    nbr_create = 0
-                    onhand = mrp_product.mrp_qty_available  # TODO: unreserved?
-                    if mrp_product.mrp_nbr_days == 0:
-                        # todo: review ordering by date
-                        for move in mrp_product.mrp_move_ids:
-                            if move.mrp_action == 'none':
-                                if (onhand + move.mrp_qty) < \
-                                        mrp_product.mrp_minimum_stock:
-                                    qtytoorder = \
-                                        mrp_product.mrp_minimum_stock - \
-                                        onhand - move.mrp_qty
-                                    cm = self.create_move(
-                                        mrp_product_id=mrp_product,
-                                        mrp_date=move.mrp_date,
-                                        mrp_qty=qtytoorder, name=move.name)
-                                    qty_ordered = cm['qty_ordered']
-                                    onhand += move.mrp_qty + qty_ordered
-                                    nbr_create += 1
-                                else:
-                                    onhand += move.mrp_qty
-                    else:
-                        # TODO: review this
-                        nbr_create = self._init_mrp_move_grouped_demand(
-                            nbr_create, mrp_product)
-
-                    if onhand < mrp_product.mrp_minimum_stock and \
-                            nbr_create == 0:
-                        qtytoorder = mrp_product.mrp_minimum_stock - onhand
-                        cm = self.create_move(
-                            mrp_product_id=mrp_product,
-                            mrp_date=date.today(),
-                            mrp_qty=qtytoorder,
-                            name='Minimum Stock')
-                        qty_ordered = cm['qty_ordered']
-                        onhand += qty_ordered
-                    counter += 1
-
-            log_msg = 'MRP CALCULATION LLC %s FINISHED - NBR PRODUCTS: %s' % (
-                llc - 1, counter)
-            logger.info(log_msg)
+                    self._get_mrp_calculation_domain(
+                        mrp_area, llc, products=products))
+                counter += self._mrp_calculation_products(
+                    mrp_products, area_context)
+            llc += 1
 
-        logger.info('END MRP CALCULATION')
+        log_msg = 'MRP CALCULATION %s LLC %s FINISHED - NBR PRODUCTS: %s' % (
+            mrp_area.name, llc - 1, counter)
+        logger.info(log_msg)
+        return counter
 
     @api.model
-    def _convert_group_date_to_default(self, group_date):
-        """Odoo read_group time format include the month as locale’s
-        abbreviated name (%b). Using 'en_GB' as common language for read_group
-        calls and this conversion avoids possible issues with locales."""
-        lc = locale.setlocale(locale.LC_TIME)
-        try:
-            locale.setlocale(locale.LC_TIME, 'en_GB.UTF-8')
-            return datetime.strptime(
-                group_date, ODOO_READ_GROUP_DAY_FORMAT).strftime(
-                DEFAULT_SERVER_DATE_FORMAT)
-        finally:
-            locale.setlocale(locale.LC_TIME, lc)
+    def _get_mrp_calculation_domain(self, mrp_area, llc, products=None):
+        """Return the domain of the MRP products of ``mrp_area`` planned at
+        the low level code ``llc``, restricted to ``products`` if given."""
+        domain = [('mrp_llc', '=', llc),
+                  ('mrp_area_id', '=', mrp_area.id)]
+        if products is not None:
+            domain.append(('product_id', 'in', products.ids))
+        return domain
+
+    @api.model
+    def _mrp_calculation_products(self, mrp_products, area_context):
+        """Plan ``mrp_products``, of a same area and low level code. Return
+        the number of MRP products planned."""
+        # The moves of the whole level are netted in memory, the planned
+        # orders and the demand they explode to are written at once before
+        # moving to the next level.
+        buffer = MrpMoveBuffer()
+        moves_by_product = self._get_mrp_moves_to_net(mrp_products)
+        for mrp_product in mrp_products:
+            onhand = mrp_product.mrp_qty_available
+            minimum_stock = mrp_product.mrp_minimum_stock
+            moves = self._merge_mrp_bucket_moves(
+                moves_by_product[mrp_product.id],
+                area_context=area_context)
+            onhand, nbr_create = self._plan_lot_sizing(
+                mrp_product, moves, onhand, buffer,
+                area_context=area_context)
+
+            if onhand < minimum_stock and nbr_create == 0:
+                qtytoorder = minimum_stock - onhand
+                qty_ordered = self._plan_supply(
+                    mrp_product, date.today(), qtytoorder,
+                    'Minimum Stock', buffer,
+                    area_context=area_context)
+                onhand += qty_ordered
+        self._flush_mrp_move_buffer(buffer)
+        return len(mrp_products)
 
     @api.model
     def _init_mrp_inventory(self, mrp_product):
-        mrp_move_obj = self.env['mrp.move']
-        # Read Demand
-        demand_groups = mrp_move_obj.with_context(lang='en_GB').read_group(
-            [('mrp_product_id', '=', mrp_product.id),
-             ('mrp_type', '=', 'd')],
-            ['mrp_date', 'mrp_qty'], ['mrp_date:day'],
-        )
-        demand_qty_by_date = {}
-        for group in demand_groups:
-            # Reformat date back to default server format.
-            group_date = self._convert_group_date_to_default(
-                group['mrp_date:day'])
-            demand_qty_by_date[group_date] = group['mrp_qty']
-
-        # Read Supply
-        supply_groups = mrp_move_obj.with_context(lang='en_GB').read_group(
-            [('mrp_product_id', '=', mrp_product.id),
-             ('mrp_type', '=', 's'),
-             ('mrp_action', '=', 'none')],
-            ['mrp_date', 'mrp_qty'], ['mrp_date:day'],
-        )
-        supply_qty_by_date = {}
-        for group in supply_groups:
-            # Reformat date back to default server format.
-            group_date = self._convert_group_date_to_default(
-                group['mrp_date:day'])
-            supply_qty_by_date[group_date] = group['mrp_qty']
-
-        # Read supply actions
-        # TODO: if we remove cancel take it into account here,
-        # TODO: as well as mrp_type ('r').
-        exclude_mrp_actions = ['none', 'cancel']
-        action_groups = mrp_move_obj.with_context(lang='en_GB').read_group(
-            [('mrp_product_id', '=', mrp_product.id),
-             ('mrp_qty', '!=', 0.0),
-             ('mrp_type', '=', 's'),
-             ('mrp_action', 'not in', exclude_mrp_actions)],
-            ['mrp_date', 'mrp_qty'], ['mrp_date:day'],
-        )
-        supply_actions_qty_by_date = {}
-        for group in action_groups:
-            # Reformat date back to default server format.
-            group_date = self._convert_group_date_to_default(
-                group['mrp_date:day'])
-            supply_actions_qty_by_date[group_date] = group['mrp_qty']
-
-        # Dates
-        mrp_dates = set(mrp_move_obj.search([
-            ('mrp_product_id', '=', mrp_product.id)],
-            order='mrp_date').mapped('mrp_date'))
-
-        on_hand_qty = mrp_product.current_qty_available  # TODO: unreserved?
-        for mdt in sorted(mrp_dates):
-            mrp_inventory_data = {
-                'mrp_product_id': mrp_product.id,
-                'date': mdt,
-            }
-            demand_qty = 0.0
-            supply_qty = 0.0
-            if mdt in demand_qty_by_date.keys():
-                demand_qty = demand_qty_by_date[mdt]
-                mrp_inventory_data['demand_qty'] = abs(demand_qty)
-            if mdt in supply_qty_by_date.keys():
-                supply_qty = supply_qty_by_date[mdt]
-                mrp_inventory_data['supply_qty'] = abs(supply_qty)
-            if mdt in supply_actions_qty_by_date.keys():
-                mrp_inventory_data['to_procure'] = \
-                    supply_actions_qty_by_date[mdt]
-            mrp_inventory_data['initial_on_hand_qty'] = on_hand_qty
-            on_hand_qty += (supply_qty + demand_qty)
-            mrp_inventory_data['final_on_hand_qty'] = on_hand_qty
-
-            self.env['mrp.inventory'].create(mrp_inventory_data)
-
-    @api.model
-    def _mrp_final_process(self):
+        """Build the time-phased inventory of ``mrp_product``, that can hold
+        several MRP products: one line per product and date having moves.
+
+        The moves are summed by product and day in one query per batch of
+        products (moves spread over a period evenly over its days), the
+        projected inventory is a cumulative sum over these days and the
+        lines are inserted at once.
+        """
+        cr = self.env.cr
+        for index in range(0, len(mrp_product), BULK_INSERT_SIZE):
+            cr.execute("""
+                SELECT mp.id, mp.mrp_area_id, mp.mrp_qty_available,
+                    m.day,
+                    SUM(CASE WHEN m.mrp_type = 'd'
+                        THEN m.qty ELSE 0.0 END),
+                    SUM(CASE WHEN m.mrp_type = 's' AND m.mrp_action = 'none'
+                        THEN m.qty ELSE 0.0 END),
+                    -- TODO: if we remove cancel take it into account here,
+                    -- TODO: as well as mrp_type ('r').
+                    SUM(CASE WHEN m.mrp_type = 's'
+                        AND m.mrp_action NOT IN ('none', 'cancel')
+                        THEN m.qty ELSE 0.0 END)
+                FROM (
+                    SELECT m.mrp_product_id, m.mrp_type, m.mrp_action,
+                        day::date AS day,
+                        m.mrp_qty / (COALESCE(m.mrp_date_end, m.mrp_date) -
+                                     m.mrp_date + 1) AS qty
+                    FROM mrp_move m,
+                        generate_series(m.mrp_date,
+                                        COALESCE(m.mrp_date_end, m.mrp_date),
+                                        interval '1 day') AS day
+                    WHERE m.mrp_product_id IN %s AND m.mrp_date IS NOT NULL
+                ) AS m
+                JOIN mrp_product mp ON mp.id = m.mrp_product_id
+                GROUP BY mp.id, m.day
+                ORDER BY mp.id, m.day
+            """, (tuple(mrp_product.ids[index:index + BULK_INSERT_SIZE]),))
+            vals_list = []
+            for __, rows in groupby(cr.fetchall(), key=itemgetter(0)):
+                rows = list(rows)
+                # Only the unreserved quantity if the MRP area says so.
+                on_hand_qty = rows[0][2]
+                projection = list(accumulate(
+                    [on_hand_qty] + [row[4] + row[5] for row in rows]))
+                for row, initial_qty, final_qty in zip(
+                        rows, projection, projection[1:]):
+                    mrp_product_id, mrp_area_id, __, mdt, demand_qty, \
+                        supply_qty, to_procure = row
+                    vals_list.append({
+                        'mrp_product_id': mrp_product_id,
+                        'mrp_area_id': mrp_area_id,
+                        'date': mdt,
+                        'demand_qty': abs(demand_qty),
+                        'supply_qty': abs(supply_qty),
+                        'to_procure': to_procure,
+                        'initial_on_hand_qty': initial_qty,
+                        'final_on_hand_qty': final_qty,
+                    })
+            self._bulk_create('mrp.inventory', vals_list)
+
+    @api.model
+    def _mrp_final_process(self, mrp_areas=None, products=None):
         logger.info('START MRP FINAL PROCESS')
-        mrp_product_ids = self.env['mrp.product'].search([
-            ('mrp_llc', '<', 9999),
-            ('mrp_area_id', '!=', False)])
-
-        for mrp_product in mrp_product_ids:
-            # Build the time-phased inventory
-            self._init_mrp_inventory(mrp_product)
-
-            # Complete info on mrp_move (running availability and nbr actions)
-            qoh = mrp_product.mrp_qty_available
-
-            moves = self.env['mrp.move'].search([
-                ('mrp_product_id', '=', mrp_product.id)],
-                order='mrp_date, mrp_type desc, id')
-            for move in moves:
-                qoh = qoh + move.mrp_qty
-                move.running_availability = qoh
-
-            nbr_actions = mrp_product.mrp_move_ids.filtered(
-                lambda m: m.mrp_action != 'none')
-            horizon_4w = fields.Date.to_string(
-                date.today() + timedelta(weeks=4))
-            nbr_actions_4w = nbr_actions.filtered(
-                lambda m: m.mrp_action_date < horizon_4w)
-            if nbr_actions:
-                mrp_product.write({
-                    'nbr_mrp_actions': len(nbr_actions),
-                    'nbr_mrp_actions_4w': len(nbr_actions_4w),
-                })
+        domain = [('mrp_llc', '<', 9999),
+                  ('mrp_area_id', '!=', False)]
+        if mrp_areas is not None:
+            domain.append(('mrp_area_id', 'in', mrp_areas.ids))
+        if products is not None:
+            domain.append(('product_id', 'in', products.ids))
+        mrp_product_ids = self.env['mrp.product'].search(domain)
+
+        # Build the time-phased inventory
+        self._init_mrp_inventory(mrp_product_ids)
+        # Complete info on mrp_move (running availability and nbr actions)
+        self._complete_mrp_moves_info(mrp_product_ids)
+        self._peg_mrp_moves(mrp_product_ids)
         logger.info('END MRP FINAL PROCESS')
 
+    @api.model
+    def _peg_mrp_moves(self, mrp_products):
+        """Peg the demand moves of ``mrp_products`` to their supply moves,
+        first in first out: the quantity available covers the first
+        demand, then every supply covers the following demand in date
+        order, with one INSERT over the cumulative quantities of both.
+        Moves spread over a period until their MRP end date are split
+        evenly over its days, as the netting and the MRP inventory do."""
+        if not mrp_products:
+            return
+        cr = self.env.cr
+        mrp_product_ids = tuple(mrp_products.ids)
+        cr.execute("DELETE FROM mrp_move_pegging WHERE mrp_product_id IN %s",
+                   (mrp_product_ids,))
+        # The sums of the quantities split over days can leave residues
+        # where a demand and a supply merely touch.
+        cr.execute("""
+            WITH demand AS (
+                SELECT m.id, m.mrp_product_id, m.mrp_area_id, m.generation,
+                    SUM(-m.mrp_qty / (COALESCE(m.mrp_date_end, m.mrp_date) -
+                                      m.mrp_date + 1)) OVER (
+                        PARTITION BY m.mrp_product_id
+                        ORDER BY day, m.id) AS cum_end,
+                    -m.mrp_qty / (COALESCE(m.mrp_date_end, m.mrp_date) -
+                                  m.mrp_date + 1) AS qty
+                FROM mrp_move m,
+                    generate_series(m.mrp_date,
+                                    COALESCE(m.mrp_date_end, m.mrp_date),
+                                    interval '1 day') AS day
+                WHERE m.mrp_product_id IN %s
+                    AND m.mrp_type = 'd' AND m.mrp_qty < 0
+            ), supply AS (
+                SELECT m.id, m.mrp_product_id,
+                    GREATEST(mp.mrp_qty_available, 0) + SUM(
+                        m.mrp_qty / (COALESCE(m.mrp_date_end, m.mrp_date) -
+                                     m.mrp_date + 1)) OVER (
+                        PARTITION BY m.mrp_product_id
+                        ORDER BY day, m.id) AS cum_end,
+                    m.mrp_qty / (COALESCE(m.mrp_date_end, m.mrp_date) -
+                                 m.mrp_date + 1) AS qty
+                FROM mrp_move m
+                JOIN mrp_product mp ON mp.id = m.mrp_product_id,
+                    generate_series(m.mrp_date,
+                                    COALESCE(m.mrp_date_end, m.mrp_date),
+                                    interval '1 day') AS day
+                WHERE m.mrp_product_id IN %s
+                    AND m.mrp_type = 's' AND m.mrp_qty > 0
+            )
+            INSERT INTO mrp_move_pegging (
+                mrp_area_id, mrp_product_id, generation, demand_move_id,
+                supply_move_id, qty,
+                create_uid, create_date, write_uid, write_date)
+            SELECT d.mrp_area_id, d.mrp_product_id, d.generation, d.id, s.id,
+                SUM(LEAST(d.cum_end, s.cum_end) -
+                    GREATEST(d.cum_end - d.qty, s.cum_end - s.qty)),
+                %s, now() at time zone 'UTC', %s, now() at time zone 'UTC'
+            FROM demand d
+            JOIN supply s ON s.mrp_product_id = d.mrp_product_id
+                AND s.cum_end - s.qty < d.cum_end
+                AND d.cum_end - d.qty < s.cum_end
+            GROUP BY d.mrp_area_id, d.mrp_product_id, d.generation, d.id,
+                s.id
+            HAVING SUM(LEAST(d.cum_end, s.cum_end) -
+                       GREATEST(d.cum_end - d.qty, s.cum_end - s.qty)) >
+                0.000001
+        """, (mrp_product_ids, mrp_product_ids, self.env.uid, self.env.uid))
+        self._get_mrp_run_profiler().add_records_written(cr.rowcount)
+        self.env.invalidate_all()
+
+    @api.model
+    def _complete_mrp_moves_info(self, mrp_products):
+        """Compute the running availability of all the moves of
+        ``mrp_products`` with a window function over the moves ordered by
+        date, and their number of actions, with one UPDATE each. Moves
+        spread over a period until their MRP end date are split evenly over
+        its days, as the netting and the MRP inventory do: their running
+        availability is the one after their last day."""
+        if not mrp_products:
+            return
+        cr = self.env.cr
+        mrp_product_ids = tuple(mrp_products.ids)
+        cr.execute("""
+            UPDATE mrp_move m
+            SET running_availability = running.qty
+            FROM (
+                SELECT DISTINCT ON (daily.id) daily.id, daily.qty
+                FROM (
+                    SELECT m.id, day,
+                        mp.mrp_qty_available + SUM(
+                            m.mrp_qty / (COALESCE(m.mrp_date_end,
+                                                  m.mrp_date) -
+                                         m.mrp_date + 1)) OVER (
+                            PARTITION BY m.mrp_product_id
+                            ORDER BY day, m.mrp_type DESC, m.id) AS qty
+                    FROM mrp_move m
+                    JOIN mrp_product mp ON mp.id = m.mrp_product_id,
+                        generate_series(m.mrp_date,
+                                        COALESCE(m.mrp_date_end, m.mrp_date),
+                                        interval '1 day') AS day
+                    WHERE m.mrp_product_id IN %s
+                ) AS daily
+                ORDER BY daily.id, daily.day DESC
+            ) AS running
+            WHERE running.id = m.id
+        """, (mrp_product_ids,))
+        horizon_4w = date.today() + timedelta(weeks=4)
+        cr.execute("""
+            UPDATE mrp_product mp
+            SET nbr_mrp_actions = actions.nbr,
+                nbr_mrp_actions_4w = actions.nbr_4w
+            FROM (
+                SELECT mrp_product_id, COUNT(*) AS nbr,
+                    SUM(CASE WHEN mrp_action_date < %s
+                        THEN 1 ELSE 0 END) AS nbr_4w
+                FROM mrp_move
+                WHERE mrp_product_id IN %s
+                    AND mrp_action IS DISTINCT FROM 'none'
+                GROUP BY mrp_product_id
+            ) AS actions
+            WHERE actions.mrp_product_id = mp.id
+        """, (horizon_4w, mrp_product_ids))
+        self.env.invalidate_all()
+
+    @api.model
+    def _get_net_change_since(self, last_run_date):
+        """Return the datetime from which a net change run takes the
+        changes, after the run started (database transaction start) at
+        ``last_run_date``: some margin before it, as the records written by
+        a transaction are dated when it starts but only visible once it
+        commits."""
+        margin = int(self.env['ir.config_parameter'].sudo().get_param(
+            'mrp_multi_level.net_change_margin', NET_CHANGE_MARGIN))
+        return fields.Datetime.to_string(
+            fields.Datetime.from_string(last_run_date) -
+            timedelta(seconds=margin))
+
+    @api.model
+    def _get_net_change_product_ids(self, since):
+        """Return the ids of the products whose MRP data may have changed
+        since the datetime ``since``, from the modification dates and the
+        current plan. The
+        deleted records and the changed MRP areas are queued as
+        ``mrp.net.change`` instead. To extend with other sources of changes
+        where needed."""
+        today = fields.Date.today()
+        generation = self.env['mrp.product']._get_current_mrp_generation()
+        queries = [
+            # Stock moves and on hand quantities.
+            ("SELECT product_id FROM stock_move WHERE write_date >= %s",
+             (since,)),
+            ("SELECT product_id FROM stock_quant WHERE write_date >= %s",
+             (since,)),
+            # Purchase order lines, or their orders.
+            ("""SELECT pol.product_id
+                FROM purchase_order_line pol
+                JOIN purchase_order po ON po.id = pol.order_id
+                WHERE pol.write_date >= %s OR po.write_date >= %s""",
+             (since, since)),
+            ("""SELECT product_id FROM stock_demand_estimate
+                WHERE write_date >= %s""", (since,)),
+            # Bills of materials, both the parents and the components.
+            ("""SELECT pp.id
+                FROM mrp_bom b
+                JOIN product_product pp
+                    ON pp.product_tmpl_id = b.product_tmpl_id
+                WHERE b.write_date >= %s""", (since,)),
+            ("""SELECT pp.id
+                FROM mrp_bom_line bl
+                JOIN mrp_bom b ON b.id = bl.bom_id
+                JOIN product_product pp
+                    ON pp.product_tmpl_id = b.product_tmpl_id
+                WHERE bl.write_date >= %s
+                UNION
+                SELECT product_id FROM mrp_bom_line
+                WHERE write_date >= %s""", (since, since)),
+            # Suppliers of the products, created or changed. Their other
+            # changes, the routes of the categories and the calendars of
+            # the warehouses are queued as ``mrp.net.change``.
+            ("""SELECT COALESCE(si.product_id, pp.id)
+                FROM product_supplierinfo si
+                JOIN product_product pp
+                    ON pp.product_tmpl_id = si.product_tmpl_id
+                WHERE si.write_date >= %s""", (since,)),
+            # MRP parameters of the products.
+            ("""SELECT pp.id
+                FROM product_product pp
+                JOIN product_template pt ON pt.id = pp.product_tmpl_id
+                WHERE pp.write_date >= %s OR pt.write_date >= %s""",
+             (since, since)),
+            # Products whose plan has dates that are past now, or inside
+            # the frozen time fence of their area.
+            ("""SELECT mm.product_id
+                FROM mrp_move mm
+                JOIN mrp_area a ON a.id = mm.mrp_area_id
+                WHERE mm.generation = %s AND mm.mrp_date <
+                    %s::date + COALESCE(a.frozen_fence, 0)""",
+             (generation, today)),
+            # Products whose plan has crossed the bucket horizon of their
+            # area since the last run.
+            ("""SELECT mm.product_id
+                FROM mrp_move mm
+                JOIN mrp_area a ON a.id = mm.mrp_area_id
+                WHERE mm.generation = %s AND a.bucket_size != 'day'
+                    AND mm.mrp_date >= %s::date + a.bucket_horizon
+                    AND mm.mrp_date < %s::date + a.bucket_horizon + 31""",
+             (generation, since, today)),
+            # Products with demand or supply that has entered the planning
+            # horizon of an area since the last run.
+            ("""SELECT sm.product_id
+                FROM stock_move sm, mrp_area a
+                WHERE a.planning_horizon > 0
+                    AND sm.state NOT IN ('done', 'cancel')
+                    AND sm.date_expected >= %s::date + a.planning_horizon
+                    AND sm.date_expected < %s::date + a.planning_horizon + 1
+                UNION
+                SELECT pol.product_id
+                FROM purchase_order_line pol, mrp_area a
+                WHERE a.planning_horizon > 0
+                    AND pol.date_planned >= %s::date + a.planning_horizon
+                    AND pol.date_planned < %s::date + a.planning_horizon + 1
+                UNION
+                SELECT e.product_id
+                FROM stock_demand_estimate e
+                JOIN date_range dr ON dr.id = e.date_range_id
+                JOIN mrp_area a ON a.planning_horizon > 0
+                WHERE dr.date_start <= %s::date + a.planning_horizon
+                    AND dr.date_end >= %s::date + a.planning_horizon""",
+             (since, today, since, today, today, since)),
+            # Products whose MRP product is missing or outdated.
+            ("""SELECT pp.id
+                FROM product_product pp
+                LEFT JOIN mrp_product mp
+                    ON mp.product_id = pp.id AND mp.generation = %s
+                WHERE (pp.mrp_applicable AND mp.id IS NULL)
+                    OR (NOT pp.mrp_applicable AND mp.id IS NOT NULL)
+                    OR mp.mrp_llc != pp.llc""", (generation,)),
+        ]
+        product_ids = set()
+        for query, params in queries:
+            self.env.cr.execute(query, params)
+            product_ids.update(row[0] for row in self.env.cr.fetchall())
+        product_ids.discard(None)
+        return product_ids
+
+    @api.model
+    def _get_net_change_affected_products(self, product_ids):
+        """Extend ``product_ids`` with all the products whose requirements
+        depend on them: their components through the current BoMs, and the
+        products that received demand from them in the current plan (in
+        case a component has been removed from a BoM)."""
+        graph = self._get_bom_graph()
+        self.env.cr.execute("""
+            SELECT DISTINCT up.product_id, down.product_id
+            FROM mrp_move_rel rel
+            JOIN mrp_move up ON up.id = rel.move_up_id
+            JOIN mrp_move down ON down.id = rel.move_down_id
+            WHERE up.generation = %s
+        """, (self.env['mrp.move']._get_current_mrp_generation(),))
+        for product_id, component_id in self.env.cr.fetchall():
+            graph[product_id].add(component_id)
+        affected = set(product_ids)
+        stack = list(affected)
+        while stack:
+            for component_id in graph.get(stack.pop(), ()):
+                if component_id not in affected:
+                    affected.add(component_id)
+                    stack.append(component_id)
+        return self.env['product.product'].with_context(
+            active_test=False).browse(sorted(affected))
+
+    @api.model
+    def _mrp_copy_net_change(self, products):
+        """Copy the plan of the current generation to the one of the run,
+        except the MRP data of ``products``, planned again. The demand they
+        received from planned orders of products that are not planned
+        again is copied too, without MRP product: it is linked to the new
+        MRP products after the initialisation (see
+        :meth:`_relink_mrp_moves`). The current plan is left untouched.
+
+        The rows are copied with plain INSERT ... SELECT statements, the
+        ids of the copied moves being drawn beforehand in a temporary table
+        to copy the links between them.
+        """
+        logger.info('START MRP NET CHANGE COPY')
+        start = time.time()
+        cr = self.env.cr
+        mrp_product_obj = self.env['mrp.product']
+        current = mrp_product_obj._get_current_mrp_generation()
+        generation = mrp_product_obj._get_mrp_generation()
+        product_ids = tuple(products.ids) if products else (0,)
+        res = {}
+        columns = mrp_product_obj._get_mrp_plan_columns()
+        cr.execute("""
+            INSERT INTO mrp_product (generation, %s)
+            SELECT %%s, %s
+            FROM mrp_product
+            WHERE generation = %%s AND product_id NOT IN %%s
+        """ % (', '.join(columns), ', '.join(columns)),
+            (generation, current, product_ids))
+        res['mrp_product'] = cr.rowcount
+        # The MRP products of the run, by product and area, are the copies
+        # of the ones of the current plan.
+        new_mrp_product_join = """
+            JOIN mrp_product old ON old.id = t.mrp_product_id
+            JOIN mrp_product mp ON mp.product_id = old.product_id
+                AND mp.mrp_area_id = old.mrp_area_id
+                AND mp.generation = %s"""
+        columns = self.env['mrp.inventory']._get_mrp_plan_columns(
+            exclude=['mrp_product_id'])
+        cr.execute("""
+            INSERT INTO mrp_inventory (generation, mrp_product_id, %s)
+            SELECT %%s, mp.id, %s
+            FROM mrp_inventory t
+            %s
+            WHERE t.generation = %%s
+        """ % (', '.join(columns),
+               ', '.join('t.%s' % col for col in columns),
+               new_mrp_product_join),
+            (generation, generation, current))
+        res['mrp_inventory'] = cr.rowcount
+        cr.execute("""
+            CREATE TEMPORARY TABLE mrp_move_copy ON COMMIT DROP AS
+            SELECT m.id AS old_id, nextval('mrp_move_id_seq') AS new_id
+            FROM mrp_move m
+            WHERE m.generation = %s
+                AND (m.product_id NOT IN %s OR EXISTS (
+                    SELECT 1
+                    FROM mrp_move_rel rel
+                    JOIN mrp_move up ON up.id = rel.move_up_id
+                    WHERE rel.move_down_id = m.id
+                        AND up.product_id NOT IN %s))
+        """, (current, product_ids, product_ids))
+        columns = self.env['mrp.move']._get_mrp_plan_columns(
+            exclude=['mrp_product_id'])
+        # The moves of the products planned again get no MRP product: it
+        # is not created yet in the plan of the run.
+        cr.execute("""
+            INSERT INTO mrp_move (id, generation, mrp_product_id, %s)
+            SELECT c.new_id, %%s, mp.id, %s
+            FROM mrp_move_copy c
+            JOIN mrp_move m ON m.id = c.old_id
+            LEFT JOIN mrp_product mp ON mp.product_id = m.product_id
+                AND mp.mrp_area_id = m.mrp_area_id
+                AND mp.generation = %%s
+        """ % (', '.join(columns),
+               ', '.join('m.%s' % col for col in columns)),
+            (generation, generation))
+        res['mrp_move'] = cr.rowcount
+        cr.execute("""
+            INSERT INTO mrp_move_rel (move_up_id, move_down_id)
+            SELECT up.new_id, down.new_id
+            FROM mrp_move_rel rel
+            JOIN mrp_move_copy up ON up.old_id = rel.move_up_id
+            JOIN mrp_move_copy down ON down.old_id = rel.move_down_id
+        """)
+        res['mrp_move_rel'] = cr.rowcount
+        # The pegging of the products planned again is computed again by
+        # the final process.
+        columns = self.env['mrp.move.pegging']._get_mrp_plan_columns(
+            exclude=['mrp_product_id', 'demand_move_id', 'supply_move_id'])
+        cr.execute("""
+            INSERT INTO mrp_move_pegging (
+                generation, mrp_product_id, demand_move_id, supply_move_id,
+                %s)
+            SELECT %%s, mp.id, d.new_id, s.new_id, %s
+            FROM mrp_move_pegging t
+            JOIN mrp_move_copy d ON d.old_id = t.demand_move_id
+            JOIN mrp_move_copy s ON s.old_id = t.supply_move_id
+            %s
+            WHERE t.generation = %%s
+        """ % (', '.join(columns),
+               ', '.join('t.%s' % col for col in columns),
+               new_mrp_product_join),
+            (generation, generation, current))
+        res['mrp_move_pegging'] = cr.rowcount
+        cr.execute("DROP TABLE mrp_move_copy")
+        self._get_mrp_run_profiler().add_records_written(
+            sum(res.values()))
+        self.env.invalidate_all()
+        res['duration'] = time.time() - start
+        log_msg = 'END MRP NET CHANGE COPY - COPIED: %s PRODUCTS, %s ' \
+                  'MOVES, %s INVENTORIES IN %.2fs - NBR PRODUCTS PLANNED ' \
+                  'AGAIN: %s' % (
+                      res['mrp_product'], res['mrp_move'],
+                      res['mrp_inventory'], res['duration'], len(products))
+        logger.info(log_msg)
+        return res
+
+    @api.model
+    def _relink_mrp_moves(self, mrp_areas=None):
+        """Link the moves copied without MRP product by a net change run
+        (see :meth:`_mrp_copy_net_change`) to the new MRP products, dropping
+        the ones whose product is no longer planned."""
+        cr = self.env.cr
+        conditions = ['m.mrp_product_id IS NULL', 'm.generation = %s']
+        params = [self.env['mrp.move']._get_mrp_generation()]
+        if mrp_areas is not None:
+            conditions.append('m.mrp_area_id IN %s')
+            params.append(tuple(mrp_areas.ids) or (None,))
+        where = ' AND '.join(conditions)
+        cr.execute("""
+            UPDATE mrp_move m SET mrp_product_id = mp.id
+            FROM mrp_product mp
+            WHERE %s
+                AND mp.product_id = m.product_id
+                AND mp.mrp_area_id = m.mrp_area_id
+                AND mp.generation = m.generation
+        """ % where, params)
+        self._get_mrp_run_profiler().add_records_written(cr.rowcount)
+        cr.execute("DELETE FROM mrp_move m WHERE %s" % where, params)
+        self.env.invalidate_all()
+
+    @api.model
+    def _get_last_run_date(self):
+        return self.env['ir.config_parameter'].sudo().get_param(
+            'mrp_multi_level.last_run_date')
+
+    @api.model
+    def _set_last_run_date(self, run_date):
+        self.env['ir.config_parameter'].sudo().set_param(
+            'mrp_multi_level.last_run_date', run_date)
+
+    @api.model
+    def _set_mrp_generation(self, generation):
+        """Make ``generation`` the MRP plan read by the planners."""
+        self.env['ir.config_parameter'].sudo().set_param(
+            'mrp_multi_level.generation', str(generation))
+
+    @api.model
+    def _mrp_gc_generations(self):
+        """Delete the MRP plan generations that are neither the current one
+        nor the one of a run that is not done."""
+        return self._mrp_cleanup(
+            keep_generations=self.env['mrp.run']._get_kept_generations())
+
+    @api.model
+    def _cron_mrp_gc_generations(self):
+        self._mrp_gc_generations()
+        return True
+
+    @api.model
+    def _mrp_initialisation_area(self, mrp_area, products=None):
+        """Initialise the plan of a single MRP area. Return its
+        :class:`MrpAreaContext`."""
+        profiler = self._get_mrp_run_profiler()
+        with profiler.phase(self.env.cr, 'initialisation', mrp_area=mrp_area):
+            area_context = self._get_mrp_area_context(mrp_area)
+            self._init_mrp_area(
+                mrp_area, self._get_mrp_applicable_products(products),
+                area_context=area_context)
+            if products is not None:
+                self._relink_mrp_moves(mrp_areas=mrp_area)
+        return area_context
+
+    @api.model
+    def _mrp_run_area(self, mrp_area, mrp_lowest_llc, products=None):
+        """Initialise and calculate the plan of a single MRP area."""
+        area_context = self._mrp_initialisation_area(
+            mrp_area, products=products)
+        self._mrp_calculation_area(
+            mrp_area, mrp_lowest_llc, products=products,
+            area_context=area_context)
+
+    @api.model
+    def _mrp_run_area_worker(self, mrp_area_id, mrp_lowest_llc,
+                             product_ids=None):
+        """Plan an MRP area in a new transaction, committed when done.
+        Meant to be run in a separate thread."""
+        with api.Environment.manage(), self.pool.cursor() as cr:
+            threading.current_thread().dbname = cr.dbname
+            env = api.Environment(cr, self.env.uid, self.env.context)
+            mrp_area = env['mrp.area'].browse(mrp_area_id)
+            products = None
+            if product_ids is not None:
+                products = env['product.product'].with_context(
+                    active_test=False).browse(product_ids)
+            try:
+                env[self._name]._mrp_run_area(
+                    mrp_area, mrp_lowest_llc, products=products)
+            except Exception:
+                log_msg = 'MRP RUN OF AREA %s FAILED' % mrp_area.name
+                logger.exception(log_msg)
+                raise
+
+    @api.model
+    def _mrp_run_parallel(self, run, mrp_areas, mrp_lowest_llc,
+                          products=None):
+        """Plan every MRP area in its own thread and transaction. If one
+        of them fails, the MRP ``run`` is marked as failed: what has been
+        committed so far cannot be rolled back."""
+        if not mrp_areas:
+            return
+        # The workers have to see what has been computed so far.
+        run._commit()
+        product_ids = products.ids if products is not None else None
+        max_workers = min(len(mrp_areas), os.cpu_count() or 1)
+        log_msg = 'MRP RUN IN PARALLEL: %s AREAS, %s WORKERS' % (
+            len(mrp_areas), max_workers)
+        logger.info(log_msg)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [
+                executor.submit(self._mrp_run_area_worker, mrp_area.id,
+                                mrp_lowest_llc, product_ids)
+                for mrp_area in mrp_areas]
+        errors = [future.exception() for future in futures
+                  if future.exception()]
+        if errors:
+            # In its own transaction, the current one is rolled back.
+            with self.pool.cursor() as cr:
+                run.with_env(run.env(cr=cr)).write({
+                    'state': 'failed',
+                    'error': str(errors[0]),
+                })
+            raise errors[0]
+
+    @api.model
+    def _mrp_prepare_run(self, run, net_change_since=None):
+        """Compute the low level codes and the MRP applicable products of
+        the MRP ``run``, that claims the queued net changes, and remove the
+        obsolete plan generations. If ``net_change_since`` is given, copy the
+        current plan to the generation of the run except for the products
+        affected by these changes and by the ones made since the last run,
+        started then: only these are planned again. Return the lowest low
+        level code and the products to plan, None for all of them."""
+        profiler = self._get_mrp_run_profiler()
+        cr = self.env.cr
+        with profiler.phase(cr, 'llc'):
+            mrp_lowest_llc = self._low_level_code_calculation()
+        with profiler.phase(cr, 'applicable'):
+            self._calculate_mrp_applicable()
+        queued_product_ids = self.env['mrp.net.change']._claim(run)
+        with profiler.phase(cr, 'cleanup'):
+            self._mrp_gc_generations()
+        products = None
+        if net_change_since:
+            with profiler.phase(cr, 'net_change'):
+                product_ids = self._get_net_change_product_ids(
+                    self._get_net_change_since(net_change_since))
+                products = self._get_net_change_affected_products(
+                    product_ids | queued_product_ids)
+                self._mrp_copy_net_change(products)
+        return mrp_lowest_llc, products
+
+    @api.model
+    def _mrp_finish_run(self, run, run_date, products=None):
+        """Build the MRP inventory and the pegging of the plan computed by
+        ``run`` at the datetime ``run_date``, for ``products`` only if
+        given, and make its generation the current one."""
+        profiler = self._get_mrp_run_profiler()
+        with profiler.phase(self.env.cr, 'final_process'):
+            self._mrp_final_process(products=products)
+        self.env['mrp.net.change']._consume(run)
+        self._set_last_run_date(fields.Datetime.to_string(run_date))
+        self._set_mrp_generation(
+            self.env['mrp.product']._get_mrp_generation())
+
+    @api.multi
+    def _mrp_queue_run(self):
+        """Queue an MRP run processed in the background and open it."""
+        run = self.env['mrp.run'].create({
+            'date_start': fields.Datetime.now(),
+            'state': 'queued',
+            'background': True,
+            'net_change': self.net_change,
+            'chunk_ids': [(0, 0, {'name': 'prepare', 'sequence': 0})],
+        })
+        action = self.env.ref('mrp_multi_level.mrp_run_action').read()[0]
+        action.update({
+            'res_id': run.id,
+            'view_mode': 'form',
+            'views': [(False, 'form')],
+        })
+        return action
+
+    @api.model
+    def _mrp_run_chunk_prepare(self, chunk):
+        """Prepare the background run of ``chunk``, and queue the
+        initialisation of every MRP area."""
+        run = chunk.run_id
+        self.env.cr.execute("SELECT (now() at time zone 'UTC')")
+        run_date = self.env.cr.fetchone()[0]
+        last_run_date = self._get_last_run_date()
+        net_change = run.net_change and last_run_date
+        generation = self.env['mrp.run']._next_generation()
+        run.generation = generation
+        mrp_lowest_llc, products = self.with_context(
+            mrp_generation=generation)._mrp_prepare_run(
+            run, last_run_date if net_change else None)
+        run.write({
+            'date_start': fields.Datetime.to_string(run_date),
+            'net_change': bool(net_change),
+            'mrp_lowest_llc': mrp_lowest_llc,
+            'product_ids': [(6, 0, products.ids if products else [])],
+            'chunk_ids': [
+                (0, 0, {'name': 'initialisation',
+                        'sequence': 10,
+                        'mrp_area_id': mrp_area.id})
+                for mrp_area in self.env['mrp.area'].search([])],
+        })
+
+    @api.model
+    def _mrp_run_chunk_initialisation(self, chunk):
+        """Initialise the MRP area of ``chunk``, and queue its calculation
+        by level and batch of MRP products."""
+        run = chunk.run_id
+        products = run._get_products()
+        self._mrp_initialisation_area(chunk.mrp_area_id, products=products)
+        vals_list = []
+        for llc in range(run.mrp_lowest_llc):
+            count = self.env['mrp.product'].search_count(
+                self._get_mrp_calculation_domain(
+                    chunk.mrp_area_id, llc, products=products))
+            for offset in range(0, count, MRP_RUN_CHUNK_SIZE):
+                vals_list.append({
+                    'name': 'calculation',
+                    'sequence': 100 + llc,
+                    'mrp_area_id': chunk.mrp_area_id.id,
+                    'llc': llc,
+                    'offset': offset,
+                })
+        run.write({'chunk_ids': [(0, 0, vals) for vals in vals_list]})
+
+    @api.model
+    def _mrp_run_chunk_calculation(self, chunk):
+        """Plan the batch of MRP products of ``chunk``."""
+        profiler = self._get_mrp_run_profiler()
+        with profiler.phase(self.env.cr, 'calculation',
+                            mrp_area=chunk.mrp_area_id, llc=chunk.llc):
+            mrp_products = self.env['mrp.product'].search(
+                self._get_mrp_calculation_domain(
+                    chunk.mrp_area_id, chunk.llc,
+                    products=chunk.run_id._get_products()),
+                order='id', offset=chunk.offset, limit=MRP_RUN_CHUNK_SIZE)
+            self._mrp_calculation_products(
+                mrp_products, self._get_mrp_area_context(chunk.mrp_area_id))
+
     @api.multi
     def run_mrp_multi_level(self):
-        self._mrp_cleanup()
-        mrp_lowest_llc = self._low_level_code_calculation()
-        self._calculate_mrp_applicable()
-        self._mrp_initialisation()
-        self._mrp_calculation(mrp_lowest_llc)
-        self._mrp_final_process()
+        if self.background:
+            return self._mrp_queue_run()
+        start = time.time()
+        # Database time, so that it can be compared with the last
+        # modification dates of the records.
+        self.env.cr.execute("SELECT (now() at time zone 'UTC')")
+        run_date = self.env.cr.fetchone()[0]
+        last_run_date = self._get_last_run_date()
+        net_change = self.net_change and last_run_date
+        # Tests run in a single transaction that cannot be committed.
+        parallel = self.parallel and not getattr(
+            threading.current_thread(), 'testing', False)
+        generation = self.env['mrp.run']._next_generation()
+        run = self.env['mrp.run'].create({
+            'date_start': fields.Datetime.to_string(run_date),
+            'net_change': bool(net_change),
+            'parallel': parallel,
+            'generation': generation,
+        })
+        profiler = MrpRunProfiler()
+        self = self.with_context(
+            mrp_run_profiler=profiler, mrp_generation=generation)
+        mrp_lowest_llc, products = self._mrp_prepare_run(
+            run, last_run_date if net_change else None)
+        mrp_areas = self.env['mrp.area'].search([])
+        if parallel:
+            self._mrp_run_parallel(
+                run, mrp_areas, mrp_lowest_llc, products)
+        else:
+            for mrp_area in mrp_areas:
+                self._mrp_run_area(mrp_area, mrp_lowest_llc, products)
+        self._mrp_finish_run(run, run_date, products=products)
+        run._record_phases(
+            profiler.phases, fields.Datetime.now(), time.time() - start)
@@ -1,2 +1,3 @@
 from . import mrp_production
 from . import procurement_rule
+from . import resource_calendar
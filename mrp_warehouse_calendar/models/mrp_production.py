@@ -12,8 +12,9 @@ class MrpProduction(models.Model):
         dt_planned = fields.Datetime.from_string(self.date_planned_start)
         warehouse = self.picking_type_id.warehouse_id
         if warehouse.calendar_id and self.product_id.produce_delay:
-            date_expected_finished = warehouse.calendar_id.plan_days(
-                +1 * self.product_id.produce_delay + 1, dt_planned)
+            date_expected_finished = \
+                warehouse.calendar_id.plan_days_cached(
+                    +1 * self.product_id.produce_delay + 1, dt_planned)
             self.date_planned_finished = date_expected_finished
 
     @api.multi
@@ -22,7 +23,7 @@ class MrpProduction(models.Model):
         dt_planned = fields.Datetime.from_string(mo.date_planned_start)
         warehouse = mo.picking_type_id.warehouse_id
         if warehouse.calendar_id and mo.product_id.produce_delay:
-            date_expected = warehouse.calendar_id.plan_days(
+            date_expected = warehouse.calendar_id.plan_days_cached(
                 +1 * self.product_id.produce_delay + 1, dt_planned)
             mo.date_planned_finished = date_expected
         return mo
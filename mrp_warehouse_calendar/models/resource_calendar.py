@@ -0,0 +1,75 @@
+# Copyright 2018 Eficent Business and IT Consulting Services, S.L.
+# License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl.html).
+
+from odoo import api, models, tools
+
+
+class ResourceCalendar(models.Model):
+    _inherit = 'resource.calendar'
+
+    @api.multi
+    def plan_days_cached(self, days, day_dt, compute_leaves=False):
+        """Same as ``plan_days``, memoised per calendar, date, number of
+        days and timezone. Planning walks the attendances day by day, which
+        is costly when the same offsets are computed for many records."""
+        self.ensure_one()
+        tz = self.env.context.get('tz') or self.env.user.tz
+        return self._plan_days_cached(days, day_dt, compute_leaves, tz)
+
+    @tools.ormcache('self.id', 'days', 'day_dt', 'compute_leaves', 'tz')
+    def _plan_days_cached(self, days, day_dt, compute_leaves, tz):
+        return self.with_context(tz=tz).plan_days(
+            days, day_dt, compute_leaves=compute_leaves)
+
+    @api.model
+    def create(self, vals):
+        self.clear_caches()
+        return super(ResourceCalendar, self).create(vals)
+
+    @api.multi
+    def write(self, vals):
+        self.clear_caches()
+        return super(ResourceCalendar, self).write(vals)
+
+    @api.multi
+    def unlink(self):
+        self.clear_caches()
+        return super(ResourceCalendar, self).unlink()
+
+
+class ResourceCalendarAttendance(models.Model):
+    _inherit = 'resource.calendar.attendance'
+
+    @api.model
+    def create(self, vals):
+        self.env['resource.calendar'].clear_caches()
+        return super(ResourceCalendarAttendance, self).create(vals)
+
+    @api.multi
+    def write(self, vals):
+        self.env['resource.calendar'].clear_caches()
+        return super(ResourceCalendarAttendance, self).write(vals)
+
+    @api.multi
+    def unlink(self):
+        self.env['resource.calendar'].clear_caches()
+        return super(ResourceCalendarAttendance, self).unlink()
+
+
+class ResourceCalendarLeaves(models.Model):
+    _inherit = 'resource.calendar.leaves'
+
+    @api.model
+    def create(self, vals):
+        self.env['resource.calendar'].clear_caches()
+        return super(ResourceCalendarLeaves, self).create(vals)
+
+    @api.multi
+    def write(self, vals):
+        self.env['resource.calendar'].clear_caches()
+        return super(ResourceCalendarLeaves, self).write(vals)
+
+    @api.multi
+    def unlink(self):
+        self.env['resource.calendar'].clear_caches()
+        return super(ResourceCalendarLeaves, self).unlink()
@@ -85,3 +85,19 @@ class TestMrpWarehouseCalendar(TransactionCase):
             mo.date_planned_finished).date()
         monday = fields.Datetime.from_string('2097-01-07 09:00:00').date()
         self.assertEqual(date_plan_finished, monday)
+
+    def test_plan_days_cached(self):
+        calendar = self.env['resource.calendar'].create({
+            'name': 'Test Calendar',
+        })
+        dt = fields.Datetime.from_string('2097-01-07 09:00:00')  # Monday
+        res = calendar.plan_days_cached(-2 - 1, dt)
+        self.assertEqual(res, calendar.plan_days(-2 - 1, dt))
+        # Changing the attendances invalidates the memoised offsets.
+        calendar.attendance_ids.filtered(
+            lambda a: a.dayofweek == '4').unlink()  # No Fridays
+        res = calendar.plan_days_cached(-2 - 1, dt)
+        self.assertEqual(res, calendar.plan_days(-2 - 1, dt))
+        wednesday = fields.Datetime.from_string(
+            '2097-01-02 09:00:00').date()
+        self.assertEqual(res.date(), wednesday)